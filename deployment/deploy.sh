@@ -9,10 +9,12 @@ source venv/bin/activate
 pip3 install -r requirements.txt --quiet
 
 python3 manage.py migrate --settings=soundcloud.settings.prod
-python3 manage.py update_index --remove --settings=soundcloud.settings.prod
+python3 manage.py update_index --since --remove --settings=soundcloud.settings.prod
 python3 manage.py check --deploy --settings=soundcloud.settings.prod
 
 pkill -f gunicorn
 gunicorn soundcloud.wsgi --bind 127.0.0.1:8000 --daemon
+pkill -f process_search_queue
+nohup python3 manage.py process_search_queue --interval 5 --settings=soundcloud.settings.prod > /dev/null 2>&1 &
 sudo nginx -t
 sudo service nginx restart
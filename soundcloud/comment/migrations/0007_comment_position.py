@@ -0,0 +1,22 @@
+# Generated by Django 3.2.6 on 2026-10-17 01:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comment', '0006_auto_20220106_0846'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='position',
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['track', 'position'], name='comment_track_position_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.6 on 2026-10-17 02:10
+
+from django.db import migrations
+
+
+def delete_object_permissions(apps, schema_editor):
+    """
+    Ownership is read from the 'writer' of the comment by 'OwnershipBackend',
+    so the per-object rows assigned to the writer are no longer used.
+    """
+    UserObjectPermission = apps.get_model('guardian', 'UserObjectPermission')
+    UserObjectPermission.objects.filter(content_type__app_label='comment', content_type__model='comment').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('guardian', '0001_initial'),
+        ('comment', '0007_comment_position'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_object_permissions, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,6 @@
 from django.db import models, transaction
 from django.contrib.auth import get_user_model
-from soundcloud.utils import assign_object_perms
+from soundcloud.counters import update_counter
 from track.models import Track
 
 
@@ -10,7 +10,7 @@ class CustomCommentManager(models.Manager):
     def create(self, **kwargs):
         kwargs['group'] = kwargs.get('group') or Group.objects.create(track=kwargs.get('track'))
         instance = super().create(**kwargs)
-        assign_object_perms(instance.writer, instance)
+        update_counter(instance.track, 'comment_count', 1)
 
         return instance
 
@@ -29,5 +29,14 @@ class Comment(models.Model):
     content = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     commented_at = models.TimeField(auto_now_add=True)
+    position = models.PositiveIntegerField(null=True)  # seconds into the track, None for the comments older than positions
+
+    # User allowed to delete the comment. (see 'OwnershipBackend')
+    owner_field = 'writer'
 
     objects = CustomCommentManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['track', 'position'], name='comment_track_position_idx'),
+        ]
@@ -1,5 +1,5 @@
-from drf_spectacular.utils import OpenApiResponse, extend_schema, extend_schema_view
-from comment.serializers import TrackCommentSerializer
+from drf_spectacular.utils import OpenApiParameter, OpenApiResponse, extend_schema, extend_schema_view
+from comment.serializers import CommentThreadSerializer, TimelineBucketSerializer, TrackCommentSerializer
 
 
 comments_viewset_schema = extend_schema_view(
@@ -28,4 +28,25 @@ comments_viewset_schema = extend_schema_view(
             404: OpenApiResponse(description='Not Found'),
         }
     ),
+    threads=extend_schema(
+        summary="Get Comment Threads of Track",
+        description="Paginated by thread, newest first. Each thread comes with all of its comments.",
+        responses={
+            200: OpenApiResponse(response=CommentThreadSerializer, description='OK'),
+            404: OpenApiResponse(description='Not Found'),
+        }
+    ),
+    timeline=extend_schema(
+        summary="Get Comment Timeline of Track",
+        description="Comments bucketed per second of the track, with the count and the first comment of each second.",
+        parameters=[
+            OpenApiParameter(name='from', type=int, location=OpenApiParameter.QUERY, description='First second of the range'),
+            OpenApiParameter(name='to', type=int, location=OpenApiParameter.QUERY, description='Last second of the range'),
+        ],
+        responses={
+            200: OpenApiResponse(response=TimelineBucketSerializer(many=True), description='OK'),
+            400: OpenApiResponse(description='Bad Request'),
+            404: OpenApiResponse(description='Not Found'),
+        }
+    ),
 )
@@ -1,12 +1,17 @@
-from django.db import transaction
-from rest_framework import serializers
+from django.db import models, transaction
+from rest_framework import serializers, status
 from rest_framework.serializers import ValidationError
 from comment.models import Comment, Group
+from comment.timeline import get_timeline, invalidate_timeline
+from soundcloud.counters import update_counter
+from soundcloud.utils import ViewerRelationListSerializer, ViewerRelationMixin
 from track.serializers import CommentTrackSerializer
 from user.serializers import SimpleUserSerializer
 
 
-class TrackCommentSerializer(serializers.ModelSerializer):
+class TrackCommentSerializer(ViewerRelationMixin, serializers.ModelSerializer):
+
+    followee_field = 'writer'
 
     writer = SimpleUserSerializer(read_only=True)
     group = serializers.PrimaryKeyRelatedField(queryset=Group.objects.all(), required=False)
@@ -20,11 +25,16 @@ class TrackCommentSerializer(serializers.ModelSerializer):
             'content',
             'created_at',
             'commented_at',
+            'position',
         )
         read_only_fields = (
             'created_at',
             'commented_at',
         )
+        extra_kwargs = {
+            'position': {'required': False, 'allow_null': False},
+        }
+        list_serializer_class = ViewerRelationListSerializer
 
     def validate_group(self, value):
         if not Group.objects.filter(id=value.id, track=self.context['track']).exists():
@@ -36,16 +46,28 @@ class TrackCommentSerializer(serializers.ModelSerializer):
         data['writer'] = self.context['request'].user
         data['track'] = self.context['track']
 
+        # replies are placed where their thread is, new threads at the start without a position
+        if data.get('group') and 'position' not in data:
+            data['position'] = data['group'].comments.order_by('id').values_list('position', flat=True).first()
+        data.setdefault('position', 0)
+
         return data
 
+    def create(self, validated_data):
+        instance = super().create(validated_data)
+        invalidate_timeline(instance.track_id)
+
+        return instance
+
     @transaction.atomic
     def delete(self):
         comment = self.instance
-        group = comment.group
         comment.delete()
+        update_counter(self.context['track'], 'comment_count', -1)
+        invalidate_timeline(comment.track_id)
 
-        if not group.comments.exists():
-            group.delete()
+        # the thread goes with its last comment
+        Group.objects.filter(id=comment.group_id, comments=None).delete()
 
 
 class UserCommentSerializer(serializers.ModelSerializer):
@@ -62,3 +84,74 @@ class UserCommentSerializer(serializers.ModelSerializer):
             'created_at',
             'commented_at',
         )
+
+
+class CommentThreadListSerializer(serializers.ListSerializer):
+    """
+    Resolves the viewer flags of the comments of every thread in the page at once.
+    """
+
+    def to_representation(self, data):
+        groups = list(data.all() if isinstance(data, models.Manager) else data)
+        comments = [ comment for group in groups for comment in group.comments.all() ]
+        comment_serializer = self.child.fields['comments'].child
+        comment_serializer.resolve_viewer_relations(comments)
+        comment_serializer.resolve_user_stats(comments)
+
+        return super().to_representation(groups)
+
+
+class CommentThreadSerializer(serializers.ModelSerializer):
+
+    comments = TrackCommentSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Group
+        fields = (
+            'id',
+            'created_at',
+            'comments',
+        )
+        list_serializer_class = CommentThreadListSerializer
+
+
+class TimelineCommentWriterSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    permalink = serializers.CharField()
+    display_name = serializers.CharField()
+
+
+class TimelineCommentSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    group = serializers.IntegerField()
+    content = serializers.CharField()
+    writer = TimelineCommentWriterSerializer()
+
+
+class TimelineBucketSerializer(serializers.Serializer):
+    position = serializers.IntegerField()
+    count = serializers.IntegerField()
+    top = TimelineCommentSerializer()
+
+
+class CommentTimelineService(serializers.Serializer):
+
+    def get_position(self, name):
+        value = self.context['request'].query_params.get(name)
+        if value is None:
+            return None
+        try:
+            position = int(value)
+        except ValueError:
+            raise ValidationError(f"{name} must be a non-negative integer.")
+        if position < 0:
+            raise ValidationError(f"{name} must be a non-negative integer.")
+
+        return position
+
+    def execute(self):
+        start, end = self.get_position('from'), self.get_position('to')
+        if start is not None and end is not None and start > end:
+            raise ValidationError("from must not be greater than to.")
+
+        return status.HTTP_200_OK, get_timeline(self.context['track'].id, start, end)
@@ -0,0 +1,69 @@
+"""
+Comment overlay of the waveform player: the comments of a track bucketed per second of the track.
+
+The buckets of a whole track are computed with two queries on the (track, position) index,
+cached in Redis and dropped when a comment of the track is created or deleted.
+"""
+from bisect import bisect_left, bisect_right
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Min
+from comment.models import Comment
+
+TIMELINE_TIMEOUT = 60 * 60
+
+
+def get_timeline_key(track_id):
+    return f"comments:timeline:{track_id}"
+
+
+def build_timeline(track_id):
+    """
+    Returns [{ position, count, top }, ...] ordered by position, where top is the first comment of the second.
+    The comments older than positions have none, and are left out.
+    """
+    buckets = list(Comment.objects
+        .filter(track_id=track_id, position__isnull=False)
+        .values('position')
+        .annotate(count=Count('id'), top=Min('id'))
+        .order_by('position'))
+
+    comments = Comment.objects \
+        .filter(id__in=[ bucket['top'] for bucket in buckets ]) \
+        .values('id', 'group_id', 'content', 'writer_id', 'writer__permalink', 'writer__display_name')
+    comments = { comment['id']: comment for comment in comments }
+
+    for bucket in buckets:
+        comment = comments[bucket['top']]
+        bucket['top'] = {
+            'id': comment['id'],
+            'group': comment['group_id'],
+            'content': comment['content'],
+            'writer': {
+                'id': comment['writer_id'],
+                'permalink': comment['writer__permalink'],
+                'display_name': comment['writer__display_name'],
+            },
+        }
+
+    return buckets
+
+
+def get_timeline(track_id, start=None, end=None):
+    """
+    Returns the buckets of the track between the start and end seconds, both included.
+    """
+    buckets = cache.get(get_timeline_key(track_id))
+    if buckets is None:
+        buckets = build_timeline(track_id)
+        cache.set(get_timeline_key(track_id), buckets, TIMELINE_TIMEOUT)
+
+    positions = [ bucket['position'] for bucket in buckets ]
+    low = 0 if start is None else bisect_left(positions, start)
+    high = len(buckets) if end is None else bisect_right(positions, end)
+
+    return buckets[low:high]
+
+
+def invalidate_timeline(track_id):
+    transaction.on_commit(lambda: cache.delete(get_timeline_key(track_id)))
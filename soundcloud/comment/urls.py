@@ -8,8 +8,16 @@ comment_simple = CommentViewSet.as_view({
 comment_detail = CommentViewSet.as_view({
     'delete': 'destroy',
 })
+comment_threads = CommentViewSet.as_view({
+    'get': 'threads',
+}, ordering=['-created_at'])
+comment_timeline = CommentViewSet.as_view({
+    'get': 'timeline',
+})
 
 urlpatterns = [
     path('tracks/<int:track_id>/comments/<int:comment_id>', comment_detail),
+    path('tracks/<int:track_id>/comments/threads', comment_threads),
+    path('tracks/<int:track_id>/comments/timeline', comment_timeline),
     path('tracks/<int:track_id>/comments', comment_simple),
 ]
@@ -1,12 +1,16 @@
-from django.db.models import Q
+from django.db.models import Prefetch, Q
 from rest_framework import viewsets, mixins
+from rest_framework.decorators import action
 from rest_framework.filters import OrderingFilter
 from rest_framework.generics import get_object_or_404
-from comment.models import Comment
+from rest_framework.response import Response
+from comment.models import Comment, Group
 from comment.schemas import *
-from comment.serializers import TrackCommentSerializer
+from comment.serializers import CommentThreadSerializer, CommentTimelineService, TrackCommentSerializer
 from soundcloud.utils import CustomObjectPermissions
 from track.models import Track
+from user.models import User
+from user.serializers import SimpleUserSerializer
 
 
 @comments_viewset_schema
@@ -31,14 +35,23 @@ class CommentViewSet(mixins.CreateModelMixin,
         self.track = getattr(self, 'track', None) or get_object_or_404(track_queryset, id=self.kwargs['track_id'])
 
         if self.action in ['list']:
-            return Comment.objects\
-                .select_related('writer')\
-                .prefetch_related('writer__followers', 'writer__owned_tracks')\
-                .filter(track=self.track)
+            return Comment.objects.select_related('writer').filter(track=self.track)
+        if self.action in ['threads']:
+            # comments of the page and their distinct writers, with their stats, in one query each
+            return Group.objects.filter(track=self.track).prefetch_related(
+                Prefetch('comments', queryset=Comment.objects.order_by('created_at', 'id')),
+                Prefetch('comments__writer', queryset=User.objects.with_stats(*SimpleUserSerializer.stat_fields)),
+            )
 
         return Comment.objects.filter(track=self.track)
 
 
+    def get_serializer_class(self):
+        if self.action in ['threads']:
+            return CommentThreadSerializer
+
+        return super().get_serializer_class()
+
     def get_serializer_context(self):
         context = super().get_serializer_context()
 
@@ -52,3 +65,14 @@ class CommentViewSet(mixins.CreateModelMixin,
     def perform_destroy(self, instance):
         service = self.get_serializer(instance)
         service.delete()
+
+    @action(detail=False, methods=['GET'])
+    def threads(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @action(detail=False, methods=['GET'])
+    def timeline(self, request, *args, **kwargs):
+        service = CommentTimelineService(context=self.get_serializer_context())
+        status, data = service.execute()
+
+        return Response(status=status, data=data)
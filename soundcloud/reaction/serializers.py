@@ -1,14 +1,18 @@
 from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
 from rest_framework import serializers, status
 from rest_framework.exceptions import NotFound
 from reaction.models import Like, Repost
+from soundcloud.counters import update_counter
 from soundcloud.utils import ConflictError
 
 
 class BaseReactionService(serializers.Serializer):
 
     reaction_type = None
+    counter_field = None
 
+    @transaction.atomic
     def create(self):
         user = self.context.get('request').user
         target = self.context.get('target')
@@ -17,9 +21,11 @@ class BaseReactionService(serializers.Serializer):
         if self.reaction_type.objects.filter(user=user, object_id=target.id, content_type=content_type).exists():
             raise ConflictError(f"User <{user}>'s reaction <{self.reaction_type.__name__}> to <{target}> already exists.")
         self.reaction_type.objects.create(user=user, content_object=target)
+        update_counter(target, self.counter_field, 1)
 
         return status.HTTP_201_CREATED, f"Reaction <{self.reaction_type.__name__}> created."
 
+    @transaction.atomic
     def delete(self):
         user = self.context.get('request').user
         target = self.context.get('target')
@@ -29,6 +35,7 @@ class BaseReactionService(serializers.Serializer):
             self.reaction_type.objects.get(user=user, object_id=target.id, content_type=content_type).delete()
         except self.reaction_type.DoesNotExist:
             raise NotFound(f"User <{user}>'s reaction <{self.reaction_type.__name__}> to <{target}> does not exist.")
+        update_counter(target, self.counter_field, -1)
 
         return status.HTTP_200_OK, f"Reaction <{self.reaction_type.__name__}> deleted."
 
@@ -36,8 +43,10 @@ class BaseReactionService(serializers.Serializer):
 class LikeService(BaseReactionService):
 
     reaction_type = Like
+    counter_field = 'like_count'
 
 
 class RepostService(BaseReactionService):
 
     reaction_type = Repost
+    counter_field = 'repost_count'
@@ -0,0 +1,55 @@
+# Generated by Django 3.2.6 on 2026-10-17 00:48
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(queryset, field_name):
+    subquery = queryset.filter(**{field_name: OuterRef('pk')}).order_by().values(field_name).annotate(value=Count('*')).values('value')
+
+    return Coalesce(Subquery(subquery, output_field=IntegerField()), 0)
+
+
+def populate_counters(apps, schema_editor):
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Set = apps.get_model('set', 'Set')
+    SetTrack = apps.get_model('set', 'SetTrack')
+    Like = apps.get_model('reaction', 'Like')
+    Repost = apps.get_model('reaction', 'Repost')
+    content_type = ContentType.objects.filter(app_label='set', model='set').first()
+
+    Set.objects.update(track_count=count_of(SetTrack.objects.all(), 'set'))
+    if content_type is not None:
+        Set.objects.update(
+            like_count=count_of(Like.objects.filter(content_type=content_type), 'object_id'),
+            repost_count=count_of(Repost.objects.filter(content_type=content_type), 'object_id'),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('reaction', '0003_auto_20211226_1111'),
+        ('set', '0011_auto_20220123_1100'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='set',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='set',
+            name='repost_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='set',
+            name='track_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
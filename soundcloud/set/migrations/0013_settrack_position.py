@@ -0,0 +1,39 @@
+# Generated by Django 3.2.6 on 2026-10-17 01:02
+
+from django.db import migrations, models
+
+POSITION_GAP = 1 << 16
+
+
+def populate_positions(apps, schema_editor):
+    SetTrack = apps.get_model('set', 'SetTrack')
+
+    rows = []
+    set_id, position = None, 0
+    for row in SetTrack.objects.order_by('set_id', 'created_at', 'id').only('id', 'set_id').iterator():
+        if row.set_id != set_id:
+            set_id, position = row.set_id, 0
+        position += POSITION_GAP
+        row.position = position
+        rows.append(row)
+
+    SetTrack.objects.bulk_update(rows, ['position'], batch_size=500)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('set', '0012_set_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='settrack',
+            name='position',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='settrack',
+            index=models.Index(fields=['set', 'position'], name='set_track_position_idx'),
+        ),
+        migrations.RunPython(populate_positions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.6 on 2026-10-17 01:03
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicates(apps, schema_editor):
+    """
+    Keeps the first row of every (set, track) and recounts the sets that had duplicates.
+    """
+    Set = apps.get_model('set', 'Set')
+    SetTrack = apps.get_model('set', 'SetTrack')
+
+    duplicates = SetTrack.objects.values('set_id', 'track_id').annotate(first=Min('id'), count=Count('id')).filter(count__gt=1)
+    set_ids = set()
+    for duplicate in duplicates:
+        SetTrack.objects.filter(set_id=duplicate['set_id'], track_id=duplicate['track_id']).exclude(id=duplicate['first']).delete()
+        set_ids.add(duplicate['set_id'])
+
+    for set_id in set_ids:
+        Set.objects.filter(id=set_id).update(track_count=SetTrack.objects.filter(set_id=set_id).count())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('set', '0013_settrack_position'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='settrack',
+            constraint=models.UniqueConstraint(fields=('set', 'track'), name='set_track_unique'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.6 on 2026-10-17 01:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('set', '0014_settrack_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='set',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -1,30 +1,19 @@
 from django.db import models
-from django.db.models import Count
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.fields import GenericRelation
 from track.models import Track
 from reaction.models import Like, Repost
 from tag.models import Tag 
-from soundcloud.utils import assign_object_perms
+from soundcloud.counters import CounterMixin
 
 class CustomSetManager(models.Manager):
 
-    def create(self, **kwargs):
-        instance = super().create(**kwargs)
-        assign_object_perms(instance.creator, instance)
-
-        return instance
-
     def get_queryset(self):
 
-        return super().get_queryset().annotate(
-            track_count=Count('tracks', distinct=True),
-            like_count=Count('likes', distinct=True),
-            repost_count=Count('reposts', distinct=True),
-        ).prefetch_related('creator__followers', 'creator__owned_tracks').select_related('creator')
+        return super().get_queryset().select_related('creator')
 
 
-class Set(models.Model):
+class Set(CounterMixin, models.Model):
     PLAYLIST = 'playlist'
     ALBUM = 'album'
     EP = 'ep'
@@ -46,6 +35,7 @@ class Set(models.Model):
     type = models.CharField(max_length=15, choices=SET_TYPE_CHOICES, db_index=True) ## choices
     permalink = models.SlugField(max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     description = models.TextField(blank=True)
     genre = models.ForeignKey(Tag, related_name="genre_sets", null=True, on_delete=models.SET_NULL)
     tags = models.ManyToManyField(Tag, related_name="tag_sets")
@@ -56,6 +46,16 @@ class Set(models.Model):
     image = models.URLField(null=True, unique=True)
     tracks = models.ManyToManyField(Track, through='SetTrack', related_name='sets')
 
+    # Denormalized counters, kept in sync by the services. (see 'reconcile_counters' command)
+    track_count = models.PositiveIntegerField(default=0)
+    like_count = models.PositiveIntegerField(default=0)
+    repost_count = models.PositiveIntegerField(default=0)
+
+    counter_fields = ('track_count', 'like_count', 'repost_count',)
+
+    # User allowed to change and delete the set. (see 'OwnershipBackend')
+    owner_field = 'creator'
+
     objects = CustomSetManager()
 
     class Meta:
@@ -66,11 +66,73 @@ class Set(models.Model):
             ),
         ]
 
+class CustomSetTrackManager(models.Manager):
+
+    def get_positions(self, set, index, count, exclude=()):
+        """
+        Returns {count} increasing positions for the rows to be placed at {index} of the set (at the end if None),
+        leaving the other rows untouched unless there is no room left between the neighbours.
+        """
+        rows = self.filter(set=set).exclude(track_id__in=exclude).order_by('position', 'id')
+        positions = rows.values_list('position', flat=True)
+
+        if index is None or index > 0:
+            neighbours = list(positions[index - 1:index + 1]) if index is not None else []
+            before = neighbours[0] if neighbours else rows.aggregate(last=models.Max('position'))['last']
+            after = neighbours[1] if len(neighbours) > 1 else None
+        else:
+            before, after = None, positions.first()
+
+        if before is None and after is None:
+            return [ SetTrack.POSITION_GAP * (i + 1) for i in range(count) ]
+        if after is None:
+            return [ before + SetTrack.POSITION_GAP * (i + 1) for i in range(count) ]
+        if before is None:
+            return [ after - SetTrack.POSITION_GAP * (count - i) for i in range(count) ]
+
+        step = (after - before) // (count + 1)
+        if step == 0:
+            # the neighbours are a gap apart once renumbered, so the gap must fit {count} rows
+            self.renumber(set, exclude, gap=max(SetTrack.POSITION_GAP, count + 1))
+            return self.get_positions(set, index, count, exclude)
+
+        return [ before + step * (i + 1) for i in range(count) ]
+
+    def renumber(self, set, exclude=(), gap=None):
+        """
+        Spreads the positions of the set evenly again, {gap} apart, keeping its order.
+        """
+        gap = gap or SetTrack.POSITION_GAP
+        rows = list(self.filter(set=set).exclude(track_id__in=exclude).order_by('position', 'id').only('id'))
+        for i, row in enumerate(rows):
+            row.position = gap * (i + 1)
+
+        self.bulk_update(rows, ['position'], batch_size=500)
+
+
 class SetTrack(models.Model):
+
+    # Positions are sparse, so that a track can be inserted or moved by updating its own row only.
+    POSITION_GAP = 1 << 16
+
     set = models.ForeignKey(Set, related_name='set_tracks', on_delete=models.CASCADE)
     track = models.ForeignKey(Track, related_name='set_tracks', on_delete=models.CASCADE)
+    position = models.BigIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CustomSetTrackManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['set', 'position'], name='set_track_position_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['set', 'track'],
+                name='set_track_unique',
+            ),
+        ]
+
 
 class SetHit(models.Model):
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, null=True)
@@ -76,13 +76,34 @@ sets_viewset_schema = extend_schema_view(
     )
 )
 
-sets_track_schema=extend_schema( 
-    summary="Add/Remove Track in Set",
-    responses={
-        '200': OpenApiResponse(description='OK'),
-        '400': OpenApiResponse(description="Bad Request"),
-        '401': OpenApiResponse(description='Unauthorized'),
-        '403': OpenApiResponse(description='Permission Denied'),
-        '404': OpenApiResponse(description='Not Found'),
-    }
+sets_track_schema=extend_schema_view(
+    tracks=[
+        extend_schema(
+            methods=['GET'],
+            summary="Get Tracks in Set",
+            parameters=[
+                OpenApiParameter("page", OpenApiTypes.INT, OpenApiParameter.QUERY, description='A page number within the paginated result set.'),
+                OpenApiParameter("page_size", OpenApiTypes.INT, OpenApiParameter.QUERY, description='Number of results to return per page.'),
+            ],
+            responses={
+                '200': OpenApiResponse(response=TrackInSetSerializer(many=True), description='OK'),
+                '404': OpenApiResponse(description='Not Found'),
+            }
+        ),
+        extend_schema(
+            methods=['POST', 'PATCH', 'DELETE'],
+            summary="Add/Move/Remove Track in Set",
+            description="POST inserts the tracks at 'index' (at the end if omitted), "
+                        "PATCH moves the tracks, in the given order, to 'index' of the set without them, "
+                        "DELETE removes the tracks. Every method reports the result of each track: "
+                        "added, duplicate or not_found for POST, moved for PATCH, removed or not_in_set for DELETE.",
+            responses={
+                '200': OpenApiResponse(response=SetTrackReportSerializer, description='OK'),
+                '400': OpenApiResponse(description="Bad Request"),
+                '401': OpenApiResponse(description='Unauthorized'),
+                '403': OpenApiResponse(description='Permission Denied'),
+                '404': OpenApiResponse(description='Not Found'),
+            }
+        ),
+    ],
 )
@@ -5,10 +5,30 @@ from set.models import Set
 class SetIndex(indexes.SearchIndex, indexes.Indexable):
     text = indexes.EdgeNgramField(document=True, use_template=True, template_name='search/set_text.txt')
     set_id = indexes.IntegerField(model_attr='id')
+    creator_id = indexes.IntegerField(model_attr='creator_id')
+    title = indexes.CharField(model_attr='title', indexed=False)
+    creator_display_name = indexes.CharField(model_attr='creator__display_name', indexed=False)
+    type = indexes.CharField(model_attr='type', faceted=True)
+    genre_id = indexes.IntegerField(model_attr='genre_id', null=True)
+    genre_name = indexes.CharField(model_attr='genre__name', null=True, faceted=True)
+    pub_date = indexes.DateTimeField(model_attr='created_at')
+    is_private = indexes.BooleanField(model_attr='is_private')
+    tags = indexes.MultiValueField(faceted=True)
 
     def get_model(self):
         return Set
 
+    def prepare_tags(self, obj):
+        return [ tag.name for tag in obj.tags.all() ]
+
     def index_queryset(self, using=None):
         """Used when the entire index for model is updated."""
-        return self.get_model().objects.all()
+        return self.get_model().objects.prefetch_related('tags')
+
+    def read_queryset(self, using=None):
+        """Used when loading the objects of a page of results, in bulk."""
+        return self.get_model().objects.prefetch_related('tags')
+
+    def get_updated_field(self):
+        """Used by 'update_index --since' to only index the rows updated after the watermark."""
+        return 'updated_at'
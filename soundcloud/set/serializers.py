@@ -1,23 +1,28 @@
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema_field
 from drf_haystack.serializers import HaystackSerializerMixin
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
 from rest_framework import serializers, status
 from rest_framework.serializers import ValidationError
 from rest_framework.validators import UniqueTogetherValidator
 from track.models import Track
-from set.models import Set
-from user.models import Follow
-from soundcloud.utils import get_presigned_url, MediaUploadMixin
+from set.models import Set, SetTrack
+from soundcloud.counters import update_counter
+from soundcloud.utils import get_presigned_url, invalidate_detail_cache, MediaUploadMixin, ViewerRelationListSerializer, ViewerRelationMixin
 from tag.models import Tag
 from tag.serializers import TagSerializer
 from track.serializers import TrackInSetSerializer
 from user.serializers import SimpleUserSerializer
-from reaction.models import Like, Repost
 from set.search_indexes import SetIndex
 
 
-class SetSerializer(serializers.ModelSerializer):
+class SetSerializer(ViewerRelationMixin, serializers.ModelSerializer):
+    '''returns only first 10 tracks in the set, see GET /sets/{set_id}/tracks for the rest'''
+
+    EMBEDDED_TRACK_COUNT = 10
+
+    followee_field = 'creator'
     creator = SimpleUserSerializer(default=serializers.CurrentUserDefault(), read_only=True)
     image = serializers.SerializerMethodField()
     genre = TagSerializer(read_only=True)
@@ -65,6 +70,7 @@ class SetSerializer(serializers.ModelSerializer):
         read_only_fields = (
             'created_at',
         )
+        list_serializer_class = ViewerRelationListSerializer
 
         # Since 'creator' is read-only field, ModelSerializer wouldn't generate UniqueTogetherValidator automatically.
         validators = [
@@ -78,49 +84,20 @@ class SetSerializer(serializers.ModelSerializer):
     def get_image(self, set):
         return get_presigned_url(set.image, 'get_object')
 
+    @extend_schema_field(TrackInSetSerializer(many=True))
     def get_tracks(self, set):
 
         # hide private tracks in the queryset
         user = self.context['request'].user if self.context['request'].user.is_authenticated else None
-        tracks = set.tracks.exclude(~Q(artist=user) & Q(is_private=True)).order_by('set_tracks__created_at')
+        tracks = set.tracks.exclude(~Q(artist=user) & Q(is_private=True)).order_by('set_tracks__position', 'id')
 
-        return TrackInSetSerializer(tracks, many=True, context=self.context).data
+        return TrackInSetSerializer(tracks[:self.EMBEDDED_TRACK_COUNT], many=True, context=self.context).data
 
-    @extend_schema_field(OpenApiTypes.BOOL)
-    def get_is_liked(self, set):
-        if self.context['request'].user.is_authenticated:
-            try:                	
-                Like.objects.get(user=self.context['request'].user, set=set)
-                return True
-            except Like.DoesNotExist:
-                return False
-        else: 
-            return False 
-
-    @extend_schema_field(OpenApiTypes.BOOL)
-    def get_is_reposted(self, set):
-        if self.context['request'].user.is_authenticated:
-            try:                	
-                Repost.objects.get(user=self.context['request'].user, set=set)
-                return True
-            except Repost.DoesNotExist:
-                return False
-        else: 
-            return False
-
-    @extend_schema_field(OpenApiTypes.BOOL)
-    def get_is_followed(self, set):
-        if self.context['request'].user.is_authenticated:
-            follower = self.context['request'].user
-            followee = set.creator
-            try:
-                Follow.objects.get(follower=follower, followee=followee)
-                return True
-            except Follow.DoesNotExist:
-                return False
-        else:
-            return False
+    def overlay_viewer_relations(self, items):
+        tracks = [ track for item in items for track in item.get('tracks', []) ]
+        TrackInSetSerializer(context=self.context).overlay_viewer_relations(tracks)
 
+        return super().overlay_viewer_relations(items)
 
     def validate_permalink(self, value):
         if not any(c.isalpha() for c in value):
@@ -164,8 +141,10 @@ class SetMediaUploadSerializer(MediaUploadMixin, SetSerializer):
         return data
 
 
-class SimpleSetSerializer(serializers.ModelSerializer):
+class SimpleSetSerializer(ViewerRelationMixin, serializers.ModelSerializer):
     '''returns only first 5 tracks in the set'''
+
+    followee_field = 'creator'
     creator = SimpleUserSerializer()
     image = serializers.SerializerMethodField()
     genre = TagSerializer()
@@ -196,6 +175,7 @@ class SimpleSetSerializer(serializers.ModelSerializer):
             'is_reposted',
             'created_at'
         )
+        list_serializer_class = ViewerRelationListSerializer
 
     def get_image(self, set):
         return get_presigned_url(set.image, 'get_object')
@@ -205,59 +185,84 @@ class SimpleSetSerializer(serializers.ModelSerializer):
 
         # hide private tracks in the queryset
         user = self.context['request'].user if self.context['request'].user.is_authenticated else None
-        tracks = set.tracks.exclude(~Q(artist=user) & Q(is_private=True)).order_by('set_tracks__created_at')[:5]
+        tracks = set.tracks.exclude(~Q(artist=user) & Q(is_private=True)).order_by('set_tracks__position', 'id')[:5]
 
         return TrackInSetSerializer(tracks, many=True, context=self.context).data
-    
-    @extend_schema_field(OpenApiTypes.BOOL)
-    def get_is_liked(self, set):
-        if self.context['request'].user.is_authenticated:
-            try:                	
-                Like.objects.get(user=self.context['request'].user, set=set)
-                return True
-            except Like.DoesNotExist:
-                return False
-        else: 
-            return False 
-
-    @extend_schema_field(OpenApiTypes.BOOL)
-    def get_is_reposted(self, set):
-        if self.context['request'].user.is_authenticated:
-            try:                	
-                Repost.objects.get(user=self.context['request'].user, set=set)
-                return True
-            except Repost.DoesNotExist:
-                return False
-        else: 
-            return False
+
+
+class SetTrackResultSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    result = serializers.ChoiceField(choices=('added', 'duplicate', 'not_found', 'moved', 'removed', 'not_in_set'))
+
+
+class SetTrackReportSerializer(serializers.Serializer):
+    results = SetTrackResultSerializer(many=True)
 
 
 class SetTrackService(serializers.Serializer):
 
+    def get_index(self, required=False):
+        index = self.context.get('index')
+        if index is None and not required:
+            return None
+        if not isinstance(index, int) or isinstance(index, bool) or index < 0:
+            raise ValidationError("index must be a non-negative integer.")
+
+        return index
+
+    def get_tracks_id(self):
+        """
+        Returns the distinct ids of 'track_ids' in the given order, or None if malformed.
+        """
+        try:
+            return list(dict.fromkeys(int(d["id"]) for d in self.context['track_ids']))
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def lock(self, set):
+        # lock the set, so that concurrent edits don't pick the same positions or count twice
+        Set._base_manager.select_for_update().filter(pk=set.pk).exists()
+
+    @transaction.atomic
     def create(self):
         set = self.context['set']
         track_ids = self.context['track_ids']
+        index = self.get_index()
 
         if track_ids is None or track_ids == []:
             return status.HTTP_400_BAD_REQUEST, {"error": "track_ids 는 필수입니다."}
 
-        tracks_num = len(track_ids)
-        tracks_id = []
-        for d in track_ids:
-            tracks_id.append(d["id"])
-        tracks = Track.objects.filter(id__in=tracks_id)
-
-        if tracks.count() != tracks_num:
+        tracks_id = self.get_tracks_id()
+        if tracks_id is None:
             return status.HTTP_400_BAD_REQUEST, {"error": "track_ids 가 유효하지 않습니다."}
 
-        if set.tracks.filter(id__in=tracks_id).exists():
-            return status.HTTP_400_BAD_REQUEST, {"error": "이미 셋에 추가된 트랙이 있습니다."}
+        self.lock(set)
 
-        set.tracks.add(*tracks)
-        set.save()
+        # hide private tracks, and mark the tracks already in the set, with a single query
+        user = self.context['request'].user if self.context['request'].user.is_authenticated else None
+        in_set = dict(Track._base_manager \
+            .filter(id__in=tracks_id) \
+            .exclude(~Q(artist=user) & Q(is_private=True)) \
+            .annotate(in_set=Exists(SetTrack.objects.filter(set=set, track=OuterRef('pk')))) \
+            .values_list('id', 'in_set'))
+        added = [ id for id in tracks_id if id in in_set and not in_set[id] ]
+
+        if added:
+            positions = SetTrack.objects.get_positions(set, index, len(added))
+            SetTrack.objects.bulk_create(
+                [ SetTrack(set=set, track_id=id, position=position) for id, position in zip(added, positions) ],
+                ignore_conflicts=True,
+            )
+            update_counter(set, 'track_count', len(added))
+            invalidate_detail_cache(Set, [set.id])
+
+        results = [
+            { "id": id, "result": "added" if id in added else "duplicate" if id in in_set else "not_found" }
+            for id in tracks_id
+        ]
+        return status.HTTP_200_OK, {"results": results}
 
-        return status.HTTP_200_OK, {"all added to playlist."}
-    
+    @transaction.atomic
     def delete(self):
         set = self.context['set']
         track_ids = self.context['track_ids']
@@ -265,22 +270,52 @@ class SetTrackService(serializers.Serializer):
         if track_ids is None or track_ids == []:
             return status.HTTP_400_BAD_REQUEST, {"error": "track_ids 는 필수입니다."}
 
-        tracks_num = len(track_ids)
-        tracks_id = []
-        for d in track_ids:
-            tracks_id.append(d["id"])
-        tracks = Track.objects.filter(id__in=tracks_id)
+        tracks_id = self.get_tracks_id()
+        if tracks_id is None:
+            return status.HTTP_400_BAD_REQUEST, {"error": "track_ids 가 유효하지 않습니다."}
+
+        self.lock(set)
+        set_tracks = SetTrack.objects.filter(set=set, track_id__in=tracks_id)
+        removed = { track_id for track_id in set_tracks.values_list('track_id', flat=True) }
+
+        if removed:
+            set_tracks.delete()
+            update_counter(set, 'track_count', -len(removed))
+            invalidate_detail_cache(Set, [set.id])
 
-        if tracks.count() != tracks_num:
+        results = [ { "id": id, "result": "removed" if id in removed else "not_in_set" } for id in tracks_id ]
+        return status.HTTP_200_OK, {"results": results}
+
+    @transaction.atomic
+    def reorder(self):
+        """
+        Moves the tracks, in the given order, to {index} of the set without them.
+        Only the rows of the moved tracks are updated.
+        """
+        set = self.context['set']
+        track_ids = self.context['track_ids']
+        index = self.get_index(required=True)
+
+        if track_ids is None or track_ids == []:
+            return status.HTTP_400_BAD_REQUEST, {"error": "track_ids 는 필수입니다."}
+
+        tracks_id = self.get_tracks_id()
+        if tracks_id is None:
             return status.HTTP_400_BAD_REQUEST, {"error": "track_ids 가 유효하지 않습니다."}
 
-        if set.tracks.filter(id__in=tracks_id).count() != tracks_num:
+        self.lock(set)
+        set_tracks = { set_track.track_id: set_track for set_track in SetTrack.objects.filter(set=set, track_id__in=tracks_id) }
+
+        if len(set_tracks) != len(tracks_id):
             return status.HTTP_400_BAD_REQUEST, {"error": "셋에 없는 트랙이 포함되어 있습니다."}
 
-        set.tracks.remove(*tracks)
-        set.save()
-        
-        return status.HTTP_204_NO_CONTENT, None
+        positions = SetTrack.objects.get_positions(set, index, len(tracks_id), exclude=tracks_id)
+        for id, position in zip(tracks_id, positions):
+            set_tracks[id].position = position
+        SetTrack.objects.bulk_update(set_tracks.values(), ['position'])
+        invalidate_detail_cache(Set, [set.id])
+
+        return status.HTTP_200_OK, {"results": [ { "id": id, "result": "moved" } for id in tracks_id ]}
       
 class SetSearchSerializer(HaystackSerializerMixin, SetSerializer):
 
@@ -1,6 +1,6 @@
 from drf_spectacular.utils import OpenApiParameter, OpenApiResponse, extend_schema, extend_schema_view, OpenApiTypes
 from drf_haystack.viewsets import HaystackGenericAPIView
-from django.db.models import Q
+from django.db.models import F, Q
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.filters import OrderingFilter
@@ -10,12 +10,13 @@ from rest_framework.mixins import ListModelMixin
 from set.models import Set
 from set.schemas import *
 from set.serializers import *
-from soundcloud.utils import CustomObjectPermissions
+from soundcloud.utils import CachedRetrieveMixin, CustomObjectPermissions, SearchPagination
+from track.models import Track
 from user.models import User
 
 
 @sets_viewset_schema
-class SetViewSet(viewsets.ModelViewSet):
+class SetViewSet(CachedRetrieveMixin, viewsets.ModelViewSet):
 
     permission_classes = (CustomObjectPermissions, )
     filter_backends = (OrderingFilter, )
@@ -43,12 +44,28 @@ class SetViewSet(viewsets.ModelViewSet):
 
             self.set = getattr(self, 'set', None) or get_object_or_404(queryset, id=self.kwargs[self.lookup_url_kwarg])
             querysets = {
-                'likers': User.objects.filter(likes__set=self.set),
-                'reposters': User.objects.filter(reposts__set=self.set),
+                'likers': User.objects.with_stats().filter(likes__set=self.set),
+                'reposters': User.objects.with_stats().filter(reposts__set=self.set),
             }
             return querysets.get(self.action)
 
         return queryset
+
+    def get_cache_dependencies(self, instance):
+        return [(User, instance.creator_id)]
+
+    def get_cache_private_to(self, instance):
+        return list(instance.tracks.filter(is_private=True).values_list('artist_id', flat=True).distinct())
+
+    def overlay_counters(self, instance, data):
+        data = super().overlay_counters(instance, data)
+
+        tracks = data.get('tracks', [])
+        counters = { row['id']: row for row in Track._base_manager.filter(id__in=[ track['id'] for track in tracks ]).values('id', *Track.counter_fields) }
+        for track in tracks:
+            track.update({ field_name: value for field_name, value in counters.get(track['id'], {}).items() if field_name in track })
+
+        return data
       
     # 1. POST /sets/ - 빈 playlist 생성 - mixin 이용
     # 2. PUT /sets/{set_id} - mixin 이용
@@ -70,30 +87,73 @@ class SetViewSet(viewsets.ModelViewSet):
 class SetTrackViewSet(viewsets.GenericViewSet): 
     permission_classes = (CustomObjectPermissions, )
     lookup_url_kwarg = 'set_id'
-    serializer_class = SetTrackService
-    queryset = Set.objects.all()
+    ordering = ['position']
+
+    def get_serializer_class(self):
+        if self.request.method == 'GET':
+            return TrackInSetSerializer
+
+        return SetTrackService
+
+    def get_queryset(self):
+
+        # hide private sets in the queryset
+        user = self.request.user if self.request.user.is_authenticated else None
+        queryset = Set.objects.exclude(~Q(creator=user) & Q(is_private=True))
+
+        if self.request.method == 'GET' and self.kwargs.get(self.lookup_url_kwarg) is not None:
+
+            # hide private tracks in the queryset, in the order of the set
+            self.set = getattr(self, 'set', None) or get_object_or_404(queryset, id=self.kwargs[self.lookup_url_kwarg])
+            return Track.objects \
+                .filter(set_tracks__set=self.set) \
+                .exclude(~Q(artist=user) & Q(is_private=True)) \
+                .annotate(position=F('set_tracks__position')) \
+                .order_by('position', 'id')
+
+        return queryset
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
+        if self.request.method == 'GET':
+            return context
+
         context['set'] = self.get_object()
         track_ids = self.request.data.get('track_ids')
         context['track_ids'] = track_ids
+        context['index'] = self.request.data.get('index')
         return context
 
     # 7. POST /sets/{set_id}/tracks (add track to playlist)
     # 8. DELETE /sets/{set_id}/tracks (remove track from playlist)
-    @action(methods=['POST', 'DELETE'], detail=True)
+    # 9. GET /sets/{set_id}/tracks (list tracks in playlist)
+    # 10. PATCH /sets/{set_id}/tracks (move tracks in playlist)
+    @action(methods=['GET', 'POST', 'PATCH', 'DELETE'], detail=True)
     def tracks(self, request, *args, **kwargs):
+        if request.method == 'GET':
+            return self._list()
+
         service = self.get_serializer()
         if request.method == 'POST':
             return self._add(service)
+        elif request.method == 'PATCH':
+            return self._reorder(service)
         else:
             return self._remove(service)
 
+    def _list(self):
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     def _add(self, service):
         status, data = service.create()
         return Response(status=status, data=data)
 
+    def _reorder(self, service):
+        status, data = service.reorder()
+        return Response(status=status, data=data)
+
     def _remove(self, service):
         status, data = service.delete()
         return Response(status=status, data=data)
@@ -102,10 +162,12 @@ class SetTrackViewSet(viewsets.GenericViewSet):
 class SetSearchAPIView(ListModelMixin, HaystackGenericAPIView):
     index_models = [Set]
     serializer_class = SetSearchSerializer
+    pagination_class = SearchPagination
+    facet_fields = ('genre_name', 'tags', 'type', )
 
     def get_queryset(self, index_models=[]):
         queryset = self.object_class()._clone()
-        queryset = queryset.models(*self.index_models)
+        queryset = queryset.models(*self.index_models).load_all()
 
         ids = self.request.data.get('ids', None)
 
@@ -113,6 +175,12 @@ class SetSearchAPIView(ListModelMixin, HaystackGenericAPIView):
 
         if ids:
             q &= Q(set_id__in=ids)
+
+        if self.request.user.is_authenticated:
+            queryset = queryset.filter(Q(is_private=False) | Q(creator_id=self.request.user.id))
+        else:
+            queryset = queryset.filter(is_private=False)
+
         return queryset.filter(q)
 
     @extend_schema(
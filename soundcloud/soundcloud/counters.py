@@ -0,0 +1,71 @@
+"""
+Denormalized counters. Kept apart from 'soundcloud.utils', so that any models module can import them.
+"""
+from collections import defaultdict
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+
+
+def _aggregate_of(queryset, field_name, aggregate):
+    """
+    Correlated subquery aggregating the rows of the queryset whose field_name refers to the outer row, 0 without rows.
+    """
+    subquery = queryset \
+        .filter(**{field_name: OuterRef('pk')}) \
+        .order_by() \
+        .values(field_name) \
+        .annotate(value=aggregate) \
+        .values('value')
+
+    return Coalesce(Subquery(subquery, output_field=IntegerField()), 0)
+
+
+def count_of(queryset, field_name):
+    return _aggregate_of(queryset, field_name, Count('*'))
+
+
+def sum_of(queryset, field_name, sum_field):
+    return _aggregate_of(queryset, field_name, Sum(sum_field))
+
+
+def update_counters(model, field_name, deltas):
+    """
+    Adds the deltas { pk: delta } to the denormalized counter of the rows, with one UPDATE per distinct delta.
+    Counters don't go below 0.
+    """
+    pks_by_delta = defaultdict(list)
+    for pk, delta in deltas.items():
+        pks_by_delta[delta].append(pk)
+
+    for delta, pks in pks_by_delta.items():
+        value = F(field_name) + delta
+        if delta < 0:
+            value = Greatest(value, 0, output_field=IntegerField())
+
+        model._base_manager.filter(pk__in=pks).update(**{field_name: value})
+
+
+def update_counter(instance, field_name, delta):
+    """
+    Adds delta to the denormalized counter of the instance in a single UPDATE.
+    """
+    update_counters(instance._meta.model, field_name, { instance.pk: delta })
+
+
+class CounterMixin:
+    """
+    Must be used with 'django.db.models.Model'.
+    Counter fields are only written by 'update_counter', so that saving a stale instance doesn't overwrite them.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            deferred_fields = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields and field.attname not in deferred_fields
+            ]
+
+        super().save(*args, **kwargs)
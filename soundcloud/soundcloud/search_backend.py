@@ -0,0 +1,447 @@
+"""
+SQLite FTS5 backend for haystack.
+
+The whole index is a single SQLite database in WAL mode: every worker reads its own snapshot
+without blocking the others or the writer, and writes are applied per document in short transactions.
+The document field is matched by term prefix, like the edge n-grams of the text fields,
+and the other fields are kept as JSON and filtered in SQL.
+The fields listed in the 'INDEXED_FIELDS' option of the connection get an expression index on their JSON path.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import tree
+from haystack.backends import BaseEngine, BaseSearchBackend, BaseSearchQuery, log_query
+from haystack.constants import DEFAULT_ALIAS, DJANGO_CT, DJANGO_ID, FILTER_SEPARATOR, ID, VALID_FILTERS
+from haystack.exceptions import SearchBackendError, SkipDocument
+from haystack.inputs import BaseInput, Exact
+from haystack.models import SearchResult
+from haystack.utils import get_identifier, get_model_ct
+from haystack.utils.app_loading import haystack_get_model
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS document (
+    rowid INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    django_ct TEXT NOT NULL,
+    django_id TEXT NOT NULL,
+    fields TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS document_django_ct ON document (django_ct);
+CREATE VIRTUAL TABLE IF NOT EXISTS document_text USING fts5 (
+    text,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '1 2 3'
+);
+"""
+
+FIELD_INDEX = "CREATE INDEX IF NOT EXISTS document_field_{field} ON document (json_extract(fields, '$.{field}'), django_ct);"
+
+TERM_RE = re.compile(r'\w+')
+
+FACET_LIMIT = 100
+
+MATCH_CLAUSE = 'd.rowid IN (SELECT rowid FROM document_text WHERE document_text MATCH ?)'
+
+OPERATORS = {
+    'content': '=',
+    'exact': '=',
+    'gt': '>',
+    'gte': '>=',
+    'lt': '<',
+    'lte': '<=',
+}
+
+LIKE_PATTERNS = {
+    'contains': '%{}%',
+    'fuzzy': '%{}%',
+    'startswith': '{}%',
+    'endswith': '%{}',
+}
+
+
+class Statement:
+    """
+    WHERE clause of a search, and the full text query its results are ranked by.
+    """
+
+    def __init__(self, where, params, match=None):
+        self.where = where
+        self.params = params
+        self.match = match
+
+    def __str__(self):
+        return self.where
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+
+    def __init__(self, connection_alias, **connection_options):
+        super().__init__(connection_alias, **connection_options)
+
+        if not connection_options.get('PATH'):
+            raise ImproperlyConfigured(f"You must specify a 'PATH' in your settings for connection '{connection_alias}'.")
+
+        self.path = connection_options['PATH']
+        self.indexed_fields = connection_options.get('INDEXED_FIELDS', ())
+        self.local = threading.local()
+
+    def get_connection(self):
+        """
+        One connection per thread, reopened after a fork.
+        """
+        if getattr(self.local, 'pid', None) != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            connection.executescript(SCHEMA + ''.join(FIELD_INDEX.format(field=field) for field in self.indexed_fields))
+            self.local.connection, self.local.pid = connection, os.getpid()
+
+        return self.local.connection
+
+    @contextmanager
+    def write(self):
+        connection = self.get_connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def get_unified_index(self):
+        from haystack import connections
+
+        return connections[self.connection_alias].get_unified_index()
+
+    def update(self, index, iterable, commit=True):
+        documents = []
+        for obj in iterable:
+            try:
+                documents.append(index.full_prepare(obj))
+            except SkipDocument:
+                self.log.debug("Indexing for object `%s` skipped", obj)
+
+        if not documents:
+            return
+
+        document_field = self.get_unified_index().document_field
+        try:
+            with self.write() as connection:
+                for document in documents:
+                    text = document.pop(document_field, None) or ''
+                    fields = json.dumps({
+                        key: self._from_python(value) for key, value in document.items()
+                        if key not in (ID, DJANGO_CT, DJANGO_ID, 'boost')
+                    })
+                    row = connection.execute('SELECT rowid FROM document WHERE id = ?', (document[ID],)).fetchone()
+                    if row:
+                        rowid = row[0]
+                        connection.execute('UPDATE document SET fields = ? WHERE rowid = ?', (fields, rowid))
+                        connection.execute('DELETE FROM document_text WHERE rowid = ?', (rowid,))
+                    else:
+                        rowid = connection.execute(
+                            'INSERT INTO document (id, django_ct, django_id, fields) VALUES (?, ?, ?, ?)',
+                            (document[ID], document[DJANGO_CT], str(document[DJANGO_ID]), fields),
+                        ).lastrowid
+                    connection.execute('INSERT INTO document_text (rowid, text) VALUES (?, ?)', (rowid, text))
+        except sqlite3.Error:
+            if not self.silently_fail:
+                raise
+
+            self.log.error("Failed to update the search index of '%s'", index, exc_info=True)
+
+    def remove(self, obj_or_string, commit=True):
+        identifier = get_identifier(obj_or_string)
+        try:
+            with self.write() as connection:
+                connection.execute('DELETE FROM document_text WHERE rowid IN (SELECT rowid FROM document WHERE id = ?)', (identifier,))
+                connection.execute('DELETE FROM document WHERE id = ?', (identifier,))
+        except sqlite3.Error:
+            if not self.silently_fail:
+                raise
+
+            self.log.error("Failed to remove document '%s' from the search index", identifier, exc_info=True)
+
+    def clear(self, models=None, commit=True):
+        where, params = '1', []
+        if models is not None:
+            assert isinstance(models, (list, tuple))
+            params = [ get_model_ct(model) for model in models ]
+            where = f"django_ct IN ({', '.join('?' * len(params))})"
+
+        try:
+            with self.write() as connection:
+                connection.execute(f'DELETE FROM document_text WHERE rowid IN (SELECT rowid FROM document WHERE {where})', params)
+                connection.execute(f'DELETE FROM document WHERE {where}', params)
+        except sqlite3.Error:
+            if not self.silently_fail:
+                raise
+
+            self.log.error("Failed to clear the search index", exc_info=True)
+
+    @log_query
+    def search(self, query_string, sort_by=None, start_offset=0, end_offset=None, facets=None, models=None,
+               limit_to_registered_models=None, result_class=None, **kwargs):
+        if limit_to_registered_models is None:
+            limit_to_registered_models = getattr(settings, 'HAYSTACK_LIMIT_TO_REGISTERED_MODELS', True)
+
+        if models:
+            model_cts = [ get_model_ct(model) for model in models ]
+        elif limit_to_registered_models:
+            model_cts = self.build_models_list()
+        else:
+            model_cts = None
+
+        where, params = query_string.where, list(query_string.params)
+        if model_cts is not None:
+            where = f"{where} AND d.django_ct IN ({', '.join('?' * len(model_cts))})"
+            params += model_cts
+
+        source, score, where_params = 'document d', '0', params
+        if query_string.match:
+            # bm25() is lower for better matches
+            source = 'document d LEFT JOIN (SELECT rowid, -bm25(document_text) AS score FROM document_text WHERE document_text MATCH ?) s ON s.rowid = d.rowid'
+            score = 'IFNULL(s.score, 0)'
+            params = [query_string.match] + params
+
+        ordering = []
+        search_fields = self.get_unified_index().all_searchfields()
+        for order_by in sort_by or ():
+            field = order_by.lstrip('-')
+            if field not in search_fields:
+                raise SearchBackendError(f"Can't order by '{field}', which is not in the search index.")
+            ordering.append(f"json_extract(d.fields, '$.{field}') {'DESC' if order_by.startswith('-') else 'ASC'}")
+        ordering += ['score DESC', 'd.rowid DESC']
+
+        limit = -1 if end_offset is None else max(end_offset - start_offset, 0)
+        sql = (
+            f'SELECT d.id, d.django_ct, d.django_id, d.fields, {score} AS score, COUNT(*) OVER () AS hits FROM {source} '
+            f"WHERE {where} ORDER BY {', '.join(ordering)} LIMIT ? OFFSET ?"
+        )
+
+        try:
+            connection = self.get_connection()
+            rows = connection.execute(sql, params + [limit, start_offset]).fetchall()
+            if rows:
+                hits = rows[0][5]
+            elif start_offset:
+                hits = connection.execute(f'SELECT COUNT(*) FROM {source} WHERE {where}', params).fetchone()[0]
+            else:
+                hits = 0
+            field_facets = self._count_facets(connection, facets, where, where_params) if facets else {}
+        except sqlite3.Error:
+            if not self.silently_fail:
+                raise
+
+            self.log.error("Failed to query the search index", exc_info=True)
+            return { 'results': [], 'hits': 0 }
+
+        return {
+            'results': self._process_results(rows, result_class or SearchResult),
+            'hits': hits,
+            'facets': { 'fields': field_facets, 'dates': {}, 'queries': {} } if facets else {},
+            'spelling_suggestion': None,
+        }
+
+    def _count_facets(self, connection, facets, where, params):
+        """
+        Counts the values of the facet fields over all the hits, most frequent first.
+        """
+        search_fields = self.get_unified_index().all_searchfields()
+        counts = {}
+        for field, options in facets.items():
+            if field not in search_fields:
+                raise SearchBackendError(f"Can't facet on '{field}', which is not in the search index.")
+
+            if search_fields[field].is_multivalued:
+                source, value = f"document d, json_each(d.fields, '$.{field}') v", 'v.value'
+            else:
+                source, value = 'document d', f"json_extract(d.fields, '$.{field}')"
+
+            counts[field] = connection.execute(
+                f'SELECT {value} AS value, COUNT(*) AS count FROM {source} WHERE {where} AND value IS NOT NULL AND value != \'\' '
+                f'GROUP BY value HAVING count >= ? ORDER BY count DESC, value LIMIT ?',
+                params + [options.get('mincount', 1), options.get('limit', FACET_LIMIT)],
+            ).fetchall()
+
+        return counts
+
+    def _process_results(self, rows, result_class):
+        unified_index = self.get_unified_index()
+        indexed_models = unified_index.get_indexed_models()
+
+        results = []
+        for id, django_ct, django_id, fields, score, _ in rows:
+            app_label, model_name = django_ct.split('.')
+            model = haystack_get_model(app_label, model_name)
+            if model not in indexed_models:
+                continue
+
+            index = unified_index.get_index(model)
+            stored_fields = { ID: id }
+            for key, value in json.loads(fields).items():
+                field = index.fields.get(key)
+                if field is not None and value is not None and not field.is_multivalued:
+                    value = field.convert(value)
+                stored_fields[key] = value
+
+            results.append(result_class(app_label, model_name, django_id, score, **stored_fields))
+
+        return results
+
+    def _from_python(self, value):
+        """
+        Datetimes are kept as fixed width UTC strings, so that they compare in SQL.
+        """
+        if isinstance(value, datetime):
+            if value.tzinfo is not None:
+                value = value.astimezone(timezone.utc).replace(tzinfo=None)
+            return value.strftime('%Y-%m-%dT%H:%M:%S.%f')
+        if isinstance(value, date):
+            return value.isoformat()
+        if isinstance(value, (list, tuple, set)):
+            return [ self._from_python(item) for item in value ]
+        if value is None or isinstance(value, (bool, int, float)):
+            return value
+
+        return str(value)
+
+
+class SQLiteSearchQuery(BaseSearchQuery):
+
+    def __init__(self, using=DEFAULT_ALIAS):
+        super().__init__(using=using)
+        self._counted_facets = None
+
+    def __str__(self):
+        return str(self.build_query())
+
+    def run(self, spelling_query=None, **kwargs):
+        """
+        The facets don't depend on the slice: they are counted by the first run of the query,
+        e.g. the count of a paginator, and reused by the runs for the pages.
+        """
+        if self._counted_facets is not None:
+            kwargs['facets'] = None
+
+        super().run(spelling_query, **kwargs)
+
+        if self._counted_facets is None:
+            self._counted_facets = self._facet_counts
+        self._facet_counts = self._counted_facets
+
+    def build_query(self):
+        self.matches = []
+        where, params = self.build_where(self.query_filter)
+
+        return Statement(where, params, ' OR '.join(f'({match})' for match in self.matches) or None)
+
+    def build_where(self, node, negated=False):
+        """
+        Compiles a SQ (or django Q) tree to a WHERE clause, collecting the full text queries outside of negations.
+        """
+        negated = negated != node.negated
+        clauses, params = [], []
+        for child in node.children:
+            if isinstance(child, tree.Node):
+                clause, child_params = self.build_where(child, negated)
+            else:
+                expression, value = child
+                field, filter_type = self.split_expression(expression)
+                clause, child_params = self.build_query_fragment(field, filter_type, value, negated)
+                if clause == MATCH_CLAUSE and not negated:
+                    self.matches += child_params
+            clauses.append(clause)
+            params += child_params
+
+        where = f"({f' {node.connector} '.join(clauses)})" if clauses else '1'
+
+        return (f'NOT {where}' if node.negated else where), params
+
+    def split_expression(self, expression):
+        parts = expression.split(FILTER_SEPARATOR)
+        if len(parts) == 1 or parts[-1] not in VALID_FILTERS:
+            return parts[0], 'content'
+
+        return parts[0], parts[-1]
+
+    def build_query_fragment(self, field, filter_type, value, negated=False):
+        """
+        A NULL condition only differs from a false one under a negation, so it is left bare elsewhere,
+        where it can use the expression index of the field.
+        """
+        document_field = self.backend.get_unified_index().document_field
+        if field in ('content', document_field):
+            return self.build_match_fragment(filter_type, value)
+
+        search_field = self.backend.get_unified_index().all_searchfields().get(field)
+        if search_field is None:
+            return '0', []
+
+        if isinstance(value, BaseInput):
+            value = value.query_string
+
+        def prepare(value):
+            if not search_field.is_multivalued:
+                value = search_field.convert(value)
+            return self.backend._from_python(value)
+
+        try:
+            if filter_type in OPERATORS:
+                condition, params = f'{{}} {OPERATORS[filter_type]} ?', [prepare(value)]
+            elif filter_type in LIKE_PATTERNS:
+                escaped = re.sub(r'([\\%_])', r'\\\1', str(prepare(value)))
+                condition, params = "{} LIKE ? ESCAPE '\\'", [LIKE_PATTERNS[filter_type].format(escaped)]
+            elif filter_type == 'in':
+                params = [ prepare(item) for item in value ]
+                if not params:
+                    return '0', []
+                condition = f"{{}} IN ({', '.join('?' * len(params))})"
+            elif filter_type == 'range':
+                start, end = value
+                condition, params = '{} BETWEEN ? AND ?', [prepare(start), prepare(end)]
+            else:
+                return '0', []
+        except (TypeError, ValueError):
+            return '0', []
+
+        if search_field.is_multivalued:
+            condition = f"EXISTS (SELECT 1 FROM json_each(d.fields, '$.{field}') WHERE {condition.format('value')})"
+        else:
+            condition = condition.format(f"json_extract(d.fields, '$.{field}')")
+
+        return (f'IFNULL({condition}, 0)' if negated else condition), params
+
+    def build_match_fragment(self, filter_type, value):
+        """
+        Every term must be a prefix of a word of the document, or the phrase must appear as is for exact lookups.
+        """
+        exact = filter_type == 'exact' or isinstance(value, Exact)
+        if isinstance(value, BaseInput):
+            value = value.query_string
+
+        values = value if filter_type == 'in' else [value]
+        matches = []
+        for value in values:
+            terms = TERM_RE.findall(str(value).lower())
+            if terms:
+                matches.append(f'''"{' '.join(terms)}"''' if exact else ' AND '.join(f'"{term}"*' for term in terms))
+
+        if not matches or filter_type not in ('content', 'contains', 'startswith', 'fuzzy', 'exact', 'in'):
+            return '0', []
+
+        return MATCH_CLAUSE, [' OR '.join(f'({match})' for match in matches)]
+
+
+class SQLiteEngine(BaseEngine):
+    backend = SQLiteSearchBackend
+    query = SQLiteSearchQuery
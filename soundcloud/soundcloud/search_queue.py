@@ -0,0 +1,117 @@
+"""
+Queue of the objects to reindex.
+
+Saves and deletes of the indexed models only add the identifier of the object to a Redis set,
+and the 'process_search_queue' command applies them to the search index in batches.
+"""
+from collections import defaultdict
+from django.db import models, transaction
+from django_redis import get_redis_connection
+from haystack import connection_router, connections
+from haystack.exceptions import NotHandled
+from haystack.signals import BaseSignalProcessor
+from haystack.utils import get_identifier, get_model_ct
+from haystack.utils.app_loading import haystack_get_model
+from set.models import Set
+from track.models import Track
+from user.models import User
+
+QUEUE_KEY = 'search:queue'
+BATCH_SIZE = 500
+
+# Fields of a user shown in the indexed text of their tracks and sets
+USER_TEXT_FIELDS = ('display_name', 'email')
+
+
+def enqueue(identifiers):
+    identifiers = list(identifiers)
+    if identifiers:
+        transaction.on_commit(lambda: get_redis_connection('default').sadd(QUEUE_KEY, *identifiers))
+
+
+class QueuedSignalProcessor(BaseSignalProcessor):
+
+    def setup(self):
+        models.signals.post_save.connect(self.handle_save)
+        models.signals.post_delete.connect(self.handle_delete)
+        models.signals.m2m_changed.connect(self.handle_m2m_change)
+
+    def teardown(self):
+        models.signals.post_save.disconnect(self.handle_save)
+        models.signals.post_delete.disconnect(self.handle_delete)
+        models.signals.m2m_changed.disconnect(self.handle_m2m_change)
+
+    def is_indexed(self, model):
+        for using in self.connection_router.for_write():
+            try:
+                self.connections[using].get_unified_index().get_index(model)
+                return True
+            except NotHandled:
+                pass
+
+        return False
+
+    def handle_save(self, sender, instance, created=False, update_fields=None, **kwargs):
+        if not self.is_indexed(sender):
+            return
+
+        enqueue([get_identifier(instance)])
+
+        if sender is User and not created and (update_fields is None or set(update_fields) & set(USER_TEXT_FIELDS)):
+            enqueue(f'{get_model_ct(Track)}.{id}' for id in Track._base_manager.filter(artist=instance).values_list('id', flat=True))
+            enqueue(f'{get_model_ct(Set)}.{id}' for id in Set._base_manager.filter(creator=instance).values_list('id', flat=True))
+
+    def handle_delete(self, sender, instance, **kwargs):
+        if self.is_indexed(sender):
+            enqueue([get_identifier(instance)])
+
+    def handle_m2m_change(self, sender, instance, action, **kwargs):
+        # e.g. the tags of a track or a set
+        if action in ('post_add', 'post_remove', 'post_clear') and self.is_indexed(type(instance)):
+            enqueue([get_identifier(instance)])
+
+
+def apply(identifiers):
+    """
+    Reindexes the queued objects, and removes the ones that are no longer indexed from the index.
+    """
+    pks = defaultdict(set)
+    for identifier in identifiers:
+        app_label, model_name, pk = identifier.split('.', 2)
+        pks[(app_label, model_name)].add(pk)
+
+    for using in connection_router.for_write():
+        backend = connections[using].get_backend()
+        unified_index = connections[using].get_unified_index()
+
+        for (app_label, model_name), model_pks in pks.items():
+            model = haystack_get_model(app_label, model_name)
+            try:
+                index = unified_index.get_index(model)
+            except NotHandled:
+                continue
+
+            objects = list(index.index_queryset(using=using).filter(pk__in=model_pks))
+            backend.update(index, objects)
+
+            for pk in model_pks - { str(obj.pk) for obj in objects }:
+                backend.remove(f'{app_label}.{model_name}.{pk}')
+
+
+def process_queue(batch_size=BATCH_SIZE):
+    """
+    Applies up to batch_size queued objects. Returns their number.
+    If applying fails, they are queued again.
+    """
+    connection = get_redis_connection('default')
+    identifiers = connection.spop(QUEUE_KEY, batch_size)
+    if not identifiers:
+        return 0
+
+    try:
+        apply([ identifier.decode() for identifier in identifiers ])
+    except Exception:
+        connection.sadd(QUEUE_KEY, *identifiers)
+        raise
+
+    return len(identifiers)
@@ -78,6 +78,7 @@ INSTALLED_APPS = [
     'tag',
     'reaction',
     'utility',
+    'stream',
     'haystack',
 ]
 
@@ -168,7 +169,7 @@ REST_FRAMEWORK = {
     ),
 
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_jwt.authentication.JSONWebTokenAuthentication',
+        'user.authentication.CustomJSONWebTokenAuthentication',
     ),
 
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
@@ -178,10 +179,13 @@ REST_FRAMEWORK = {
 
 AUTHENTICATION_BACKENDS = (
     'django.contrib.auth.backends.ModelBackend', # this is default
-    'guardian.backends.ObjectPermissionBackend',
+    'soundcloud.utils.OwnershipBackend',
     # 'user.socialaccount.GoogleBackend',   
 )
 
+# guardian is only kept for the migrations that drop its object permissions. (see 'OwnershipBackend')
+SILENCED_SYSTEM_CHECKS = ['guardian.W001']
+
 # JWT Authorization
 
 JWT_AUTH = {
@@ -236,15 +240,32 @@ CACHES = {
     }
 }
 
+# Buffer track hits in redis and apply them in bulk with 'python3 manage.py flush_hits' (e.g. every minute with cron)
+TRACK_HIT_BUFFER = False
+
+# Seconds to keep the cached track/set detail responses, kept well below the lifetime of the presigned urls in them
+DETAIL_CACHE_TIMEOUT = 600
+
+# Length of the home stream timelines, and the follower count above which activities are pulled instead of fanned out
+STREAM_LENGTH = 1000
+STREAM_FANOUT_LIMIT = 10000
+
 # for Sociallogin
 SOCIAL_PASSWORD = "socialpassword"
 
 
-WHOOSH_INDEX = os.path.join(BASE_DIR, 'whoosh_index')
+# SQLite FTS5 database in WAL mode, shared by all the workers of the host
+SEARCH_INDEX = os.path.join(BASE_DIR, 'search_index', 'index.sqlite3')
 
 HAYSTACK_CONNECTIONS = {
     'default': {
-        'ENGINE': 'haystack.backends.whoosh_backend.WhooshEngine',
-        'PATH': WHOOSH_INDEX,
+        'ENGINE': 'soundcloud.search_backend.SQLiteEngine',
+        'PATH': SEARCH_INDEX,
+        # filtered on by the track and set searches
+        'INDEXED_FIELDS': ('is_private', 'artist_id', 'creator_id', 'genre_id'),
     },
 }
+
+# Saved and deleted tracks, sets and users are queued in redis and indexed by 'python3 manage.py process_search_queue'
+# Deletions missed while it was down are purged by 'python3 manage.py update_index --since --remove' (e.g. nightly with cron)
+HAYSTACK_SIGNAL_PROCESSOR = 'soundcloud.search_queue.QueuedSignalProcessor'
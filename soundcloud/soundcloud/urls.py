@@ -31,6 +31,7 @@ urlpatterns = [
     path('', include('utility.urls')),
     path('', include('track.urls')),
     path('', include('set.urls')),
+    path('', include('stream.urls')),
 ]
 
 if settings.DEBUG:
@@ -1,9 +1,20 @@
-from rest_framework.exceptions import APIException, ValidationError
-from rest_framework import permissions, status
-from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+from rest_framework import permissions, serializers, status
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import Cursor, CursorPagination, PageNumberPagination
+from rest_framework.response import Response
 from django.conf import settings
-from guardian.shortcuts import assign_perm
-import boto3, os, re
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import models, transaction
+from django.db.models import Q
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_field
+from haystack.models import SearchResult
+from reaction.models import Like, Repost
+from collections import OrderedDict
+import boto3, hashlib, json, os, re, threading, time, uuid
 
 MODEL_NAMES = ('track', 'set', 'user',)
 FIELD_NAMES = ('audio', 'image', 'image_profile', 'image_header',)
@@ -28,47 +39,145 @@ EXTENSIONS = {
 # FILENAME_PATTERN = re.compile('^[a-zA-Z0-9\/\!\-\_\.\*\'\(\)]+$')
 
 
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after `timeout` seconds.
+    """
+
+    def __init__(self, maxsize=1024, timeout=None):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires_at = self._data[key]
+            except KeyError:
+                return default
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+
+            return value
+
+    def set(self, key, value, timeout=None):
+        timeout = timeout or self.timeout
+        expires_at = time.monotonic() + timeout if timeout else None
+
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class PresignedUrlSigner:
+    """
+    Signs S3 URLs with a single boto3 client per worker process.
+    Signed GET URLs are cached by (key, expiry bucket), so every URL handed out
+    stays valid for at least `margin` more seconds.
+    """
+
+    METHODS = ('get_object', 'put_object',)
+    EXPIRATION_TIMES = {
+        'get_object': 43200,
+        'put_object': 500,
+    }
+
+    def __init__(self, maxsize=8192, margin=3600):
+        self.margin = margin
+        self.cache = TTLCache(maxsize=maxsize)
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        # boto3 clients are thread-safe, but must not be shared across forked workers.
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    self._client = boto3.client(
+                        's3',
+                        region_name=settings.S3_REGION_NAME,
+                        aws_access_key_id=settings.AWS_ACCESS_KEY,
+                        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY
+                    )
+                    self._pid = os.getpid()
+
+        return self._client
+
+    def sign(self, key, method):
+        if method not in self.METHODS:
+            raise ValueError(f"method choices: {self.METHODS}")
+
+        expiration_time = self.EXPIRATION_TIMES[method]
+
+        if method != 'get_object':
+            return self._generate(key, method, expiration_time)
+
+        # URLs signed within the same bucket expire at least `margin` seconds after the bucket ends.
+        ttl = expiration_time - self.margin
+        bucket = int(time.time()) // ttl
+        presigned_url = self.cache.get((key, bucket))
+
+        if presigned_url is None:
+            presigned_url = self._generate(key, method, expiration_time)
+            self.cache.set((key, bucket), presigned_url, timeout=ttl)
+
+        return presigned_url
+
+    def _generate(self, key, method, expiration_time):
+        return self.client.generate_presigned_url(
+            ClientMethod=method,
+            Params={
+                'Bucket': settings.S3_BUCKET_NAME,
+                'Key': key,
+            },
+            ExpiresIn=expiration_time
+        )
+
+
+signer = PresignedUrlSigner()
+
+
 def get_presigned_url(url, method, full_url=True):
     if url is None:
         return None
 
-    if method not in [ 'get_object', 'put_object' ]:
-        raise ValueError("method choices: ('get_object', 'put_object')")
+    key = url.replace(settings.S3_BASE_URL, '') if full_url else url
 
-    if full_url:
-        key = url.replace(settings.S3_BASE_URL, '')
+    return signer.sign(key, method)
 
-    expiration_time = 43200 if method in ['get_object'] else 500
 
-    presigned_url = boto3.client(
-        's3',
-        region_name=settings.S3_REGION_NAME,
-        aws_access_key_id=settings.AWS_ACCESS_KEY,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY
-    ).generate_presigned_url(
-        ClientMethod=method,
-        Params={
-            'Bucket': settings.S3_BUCKET_NAME,
-            'Key': key,
-        },
-        ExpiresIn=expiration_time
-    )
+class OwnershipBackend:
+    """
+    Grants the permissions to modify and delete an object to its owner,
+    the user in the field named by the model's 'owner_field'.
+    """
 
-    return presigned_url
+    ACTIONS = ('add', 'change', 'delete',)
 
+    def authenticate(self, request, **credentials):
+        return None
 
-def assign_object_perms(user, instance):
-    """
-    Assigns permission to modify and delete the instance to the user.
-    """
-    kwargs = {
-        'app_label': instance._meta.app_label,
-        'model_name': instance._meta.model_name
-    }
+    def has_perm(self, user_obj, perm, obj=None):
+        owner_field = getattr(obj, 'owner_field', None)
+        if owner_field is None or not user_obj.is_active:
+            return False
+
+        codenames = { f'{obj._meta.app_label}.{action}_{obj._meta.model_name}' for action in self.ACTIONS }
+        if perm not in codenames:
+            return False
 
-    assign_perm('%(app_label)s.add_%(model_name)s' % kwargs, user, instance)
-    assign_perm('%(app_label)s.change_%(model_name)s' % kwargs, user, instance)
-    assign_perm('%(app_label)s.delete_%(model_name)s' % kwargs, user, instance)
+        return getattr(obj, owner_field + '_id') == user_obj.id
 
 
 class CustomObjectPermissions(permissions.IsAuthenticatedOrReadOnly, permissions.DjangoObjectPermissions):
@@ -181,8 +290,484 @@ class MediaUploadMixin:
         return extension in valid_extensions
 
 
+class ViewerRelations:
+    """
+    Per-request map of the request user's likes, reposts and followings.
+    Flags that were not resolved in bulk beforehand are looked up one by one.
+    """
+
+    CONTEXT_KEY = 'viewer_relations'
+
+    def __init__(self, user):
+        self.user = user if user.is_authenticated else None
+        self.reactions = {Like: {}, Repost: {}}
+        self.follows = {}
+
+    @classmethod
+    def of(cls, context):
+        if cls.CONTEXT_KEY not in context:
+            context[cls.CONTEXT_KEY] = cls(context['request'].user)
+
+        return context[cls.CONTEXT_KEY]
+
+    def resolve_reactions(self, reaction_type, model, ids):
+        content_type = ContentType.objects.get_for_model(model)
+        resolved = self.reactions[reaction_type]
+        ids = { id for id in ids if (content_type.id, id) not in resolved }
+
+        if not ids:
+            return
+        if self.user is None:
+            reacted = set()
+        else:
+            reacted = set(reaction_type.objects.filter(
+                user=self.user,
+                content_type=content_type,
+                object_id__in=ids,
+            ).values_list('object_id', flat=True))
+
+        for id in ids:
+            resolved[(content_type.id, id)] = id in reacted
+
+    def resolve_follows(self, user_ids):
+        user_ids = { id for id in user_ids if id is not None and id not in self.follows }
+
+        if not user_ids:
+            return
+        if self.user is None:
+            followed = set()
+        else:
+            from user.graph import get_followed_ids
+            followed = get_followed_ids(self.user.id, user_ids)
+
+        for id in user_ids:
+            self.follows[id] = id in followed
+
+    def has_reacted(self, reaction_type, instance):
+        content_type = ContentType.objects.get_for_model(instance)
+        self.resolve_reactions(reaction_type, type(instance), [instance.id])
+
+        return self.reactions[reaction_type][(content_type.id, instance.id)]
+
+    def is_liked(self, instance):
+        return self.has_reacted(Like, instance)
+
+    def is_reposted(self, instance):
+        return self.has_reacted(Repost, instance)
+
+    def is_followed(self, user_id):
+        self.resolve_follows([user_id])
+
+        return self.follows[user_id]
+
+
+class ViewerRelationListSerializer(serializers.ListSerializer):
+    """
+    Resolves the viewer flags and nested user stats of every item in the page before serializing them.
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        items = list(iterable)
+        # search results are serialized from the objects they load
+        instances = [ item.object if isinstance(item, SearchResult) else item for item in items ]
+        instances = [ instance for instance in instances if instance is not None ]
+        self.child.resolve_viewer_relations(instances)
+        self.child.resolve_user_stats(instances)
+
+        return super().to_representation(items)
+
+
+class ViewerRelationMixin:
+    """
+    Must be used with 'rest_framework.serializers.ModelSerializer'
+    and 'ViewerRelationListSerializer' as its list serializer class.
+    """
+
+    # Name of the user field to be followed. None if the instance itself is a user.
+    followee_field = None
+
+    # Counts of 'UserQuerySet.with_stats' shown by the serializer, if it serializes users.
+    stat_fields = ()
+
+    @property
+    def viewer_relations(self):
+        return ViewerRelations.of(self.context)
+
+    def get_followee_id(self, instance):
+        if self.followee_field is None:
+            return instance.id
+
+        return getattr(instance, self.followee_field + '_id')
+
+    def resolve_viewer_relations(self, instances):
+        ids = [ instance.id for instance in instances ]
+        model = self.Meta.model
+
+        if 'is_liked' in self.fields:
+            self.viewer_relations.resolve_reactions(Like, model, ids)
+        if 'is_reposted' in self.fields:
+            self.viewer_relations.resolve_reactions(Repost, model, ids)
+
+        # nested user serializers read their 'is_followed' from the same map
+        followee = self.fields.get(self.followee_field)
+        if 'is_followed' in self.fields or 'is_followed' in getattr(followee, 'fields', {}):
+            self.viewer_relations.resolve_follows([ self.get_followee_id(instance) for instance in instances ])
+
+    def resolve_user_stats(self, instances):
+        """
+        Sets the counts shown by the nested user serializer on the nested users,
+        with one query for the distinct users of the page.
+        """
+        followee = self.fields.get(self.followee_field)
+        names = getattr(followee, 'stat_fields', ())
+        if not names:
+            return
+
+        model = followee.Meta.model
+        users = [ getattr(instance, self.followee_field, None) for instance in instances ]
+        users = [ user for user in users if isinstance(user, model) and any(name not in user.__dict__ for name in names) ]
+
+        if not users:
+            return
+
+        stats = { row['id']: row for row in model.objects.filter(id__in={ user.id for user in users }).with_stats(*names).values('id', *names) }
+        for user in users:
+            for name in names:
+                setattr(user, name, stats.get(user.id, {}).get(name, 0))
+
+    def to_representation(self, instance):
+        # a single object has not gone through the list serializer
+        if not isinstance(self.parent, serializers.ListSerializer):
+            self.resolve_user_stats([instance])
+
+        return super().to_representation(instance)
+
+    def overlay_viewer_relations(self, items):
+        """
+        Sets the viewer flags on cached representations of the serializer, resolving them in bulk.
+        """
+        model = self.Meta.model
+        instances = [ model(id=item['id']) for item in items ]
+        followees = [ item if self.followee_field is None else item.get(self.followee_field) for item in items ]
+        followee_ids = [ followee['id'] if isinstance(followee, dict) else followee for followee in followees ]
+
+        if 'is_liked' in self.fields:
+            self.viewer_relations.resolve_reactions(Like, model, [ instance.id for instance in instances ])
+        if 'is_reposted' in self.fields:
+            self.viewer_relations.resolve_reactions(Repost, model, [ instance.id for instance in instances ])
+        if 'is_followed' in self.fields or 'is_followed' in getattr(self.fields.get(self.followee_field), 'fields', {}):
+            self.viewer_relations.resolve_follows(followee_ids)
+
+        for item, instance, followee, followee_id in zip(items, instances, followees, followee_ids):
+            if 'is_liked' in item:
+                item['is_liked'] = self.viewer_relations.is_liked(instance)
+            if 'is_reposted' in item:
+                item['is_reposted'] = self.viewer_relations.is_reposted(instance)
+            if 'is_followed' in item:
+                item['is_followed'] = self.viewer_relations.is_followed(followee_id)
+            if isinstance(followee, dict) and 'is_followed' in followee:
+                followee['is_followed'] = self.viewer_relations.is_followed(followee_id)
+
+        return items
+
+    @extend_schema_field(OpenApiTypes.BOOL)
+    def get_is_liked(self, instance):
+        return self.viewer_relations.is_liked(instance)
+
+    @extend_schema_field(OpenApiTypes.BOOL)
+    def get_is_reposted(self, instance):
+        return self.viewer_relations.is_reposted(instance)
+
+    @extend_schema_field(OpenApiTypes.BOOL)
+    def get_is_followed(self, instance):
+        return self.viewer_relations.is_followed(self.get_followee_id(instance))
+
+
+def _get_version_key(model, pk):
+    return f"version:{model._meta.label_lower}:{pk}"
+
+
+def get_detail_cache_key(instance, dependencies):
+    """
+    Returns the cache key of the instance's representation, made of the current versions of
+    the instance and of its dependencies, [(model, pk), ...] of the objects it renders.
+    """
+    objects = [ (type(instance), instance.pk) ] + list(dependencies)
+    keys = [ _get_version_key(model, pk) for model, pk in objects ]
+    versions = cache.get_many(keys)
+
+    missing = { key: uuid.uuid4().hex for key in keys if key not in versions }
+    if missing:
+        cache.set_many(missing, timeout=settings.DETAIL_CACHE_TIMEOUT)
+        versions.update(missing)
+
+    return f"detail:{_get_version_key(type(instance), instance.pk)}:" + ':'.join(versions[key] for key in keys)
+
+
+def invalidate_detail_cache(model, pks):
+    """
+    Drops the versions of the objects once the transaction commits,
+    so that every cached representation that renders them is missed.
+    """
+    keys = [ _get_version_key(model, pk) for pk in set(pks) if pk is not None ]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+class CachedRetrieveMixin:
+    """
+    Serves 'retrieve' from a versioned cache of the serializer output, see 'utility.signals' for the invalidation.
+    Only the viewer flags and the counters are resolved per request.
+    """
+
+    def get_cache_dependencies(self, instance):
+        """
+        [(model, pk), ...] of the other objects the representation renders.
+        """
+        return []
+
+    def get_cache_private_to(self, instance):
+        """
+        Ids of the users who see more of the instance than the others, e.g. their own private tracks.
+        """
+        return []
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        serializer = self.get_serializer(instance)
+        key = get_detail_cache_key(instance, self.get_cache_dependencies(instance))
+        cached = cache.get(key)
+
+        if cached is None:
+            private_to = self.get_cache_private_to(instance)
+            data = serializer.data
+            if request.user.id not in private_to:
+                cache.set(key, {'data': dict(data), 'private_to': private_to}, timeout=settings.DETAIL_CACHE_TIMEOUT)
+
+            return Response(data)
+
+        if request.user.id in cached['private_to']:
+            return Response(serializer.data)
+
+        data = serializer.overlay_viewer_relations([cached['data']])[0]
+
+        return Response(self.overlay_counters(instance, data))
+
+    def overlay_counters(self, instance, data):
+        """
+        Counters, e.g. 'play_count', change too often to be cached: they are read from the instance.
+        """
+        for field_name in getattr(instance, 'counter_fields', ()):
+            if field_name in data:
+                data[field_name] = getattr(instance, field_name)
+
+        return data
+
+
+class CustomOrderingFilter(OrderingFilter):
+    """
+    Also accepts the names of the view's 'ordering_aliases', { name: ordering field }, e.g. the former names of a field.
+    """
+
+    def remove_invalid_fields(self, queryset, fields, view, request):
+        aliases = getattr(view, 'ordering_aliases', {})
+        fields = [ ('-' if field.startswith('-') else '') + aliases.get(field.lstrip('-'), field.lstrip('-')) for field in fields ]
+
+        return super().remove_invalid_fields(queryset, fields, view, request)
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Keyset pagination on (the view's first ordering field, pk), so that a page costs the same at any depth.
+    The total count is only computed with '?count=true'.
+    """
+
+    page_size_query_param = 'page_size'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+
+        ordering = (CustomOrderingFilter().get_ordering(request, queryset, view) or ('-pk', ))[0]
+        self.field = ordering.lstrip('-')
+        reverse = self.cursor is not None and self.cursor.reverse
+        descending = ordering.startswith('-') != reverse
+
+        self.count = None
+        if request.query_params.get(self.count_query_param) in ('true', '1'):
+            self.count = queryset.count()
+
+        if self.cursor is not None and self.cursor.position is not None:
+            lookup = 'lt' if descending else 'gt'
+            try:
+                value, pk = json.loads(self.cursor.position)
+                queryset = queryset.filter(
+                    Q(**{f'{self.field}__{lookup}': value}) | Q(**{self.field: value, f'pk__{lookup}': pk})
+                )
+            except (TypeError, ValueError, DjangoValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        prefix = '-' if descending else ''
+        results = list(queryset.order_by(prefix + self.field, prefix + 'pk')[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None and self.cursor.position is not None
+
+        return self.page
+
+    def _get_position(self, instance):
+        value = getattr(instance, self.field)
+        value = value.isoformat() if hasattr(value, 'isoformat') else value
+
+        return json.dumps([value, instance.pk])
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self._get_position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self._get_position(self.page[0])))
+
+    def get_paginated_response(self, data):
+        response = OrderedDict()
+        if self.count is not None:
+            response['count'] = self.count
+        response['next'] = self.get_next_link()
+        response['previous'] = self.get_previous_link()
+        response['results'] = data
+
+        return Response(response)
+
+
 class CustomPagination(PageNumberPagination):
+    """
+    Page number pagination, or keyset pagination if '?cursor=' is given (empty for the first page).
+    """
+
     page_size_query_param = 'page_size'
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.keyset_class.cursor_query_param in request.query_params and isinstance(queryset, models.QuerySet):
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                'name': self.keyset_class.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Keyset pagination cursor. Pass it empty for the first page, then follow next/previous.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.keyset_class.count_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'With cursor, whether to include the total count.',
+                'schema': {'type': 'boolean'},
+            },
+        ]
+
+
+class SearchPagination(PageNumberPagination):
+    """
+    Page number pagination of search results, with the counts of the values of the view's 'facet_fields' over all the hits.
+    The facets are counted by the search backend along with the page, and cached per normalized query.
+    Results whose object was deleted since it was indexed are left out of the page.
+    """
+
+    page_size_query_param = 'page_size'
+    facet_cache_timeout = 60
+
+    def get_facet_cache_key(self, request, view):
+        search_fields = getattr(view.serializer_class.Meta, 'search_fields', ())
+        params = {}
+        for key, values in request.query_params.lists():
+            if key in (self.page_query_param, self.page_size_query_param):
+                continue
+            if key in search_fields:
+                # the backend matches the words of the text, whatever the case and punctuation
+                values = [ ' '.join(re.findall(r'\w+', value.lower())) for value in values ]
+            params[key] = sorted(values)
+        if request.data:
+            params['data'] = request.data
+
+        digest = hashlib.md5(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+        # hits depend on the privacy of the viewer
+        return f"search:facets:{view.__class__.__name__}:{request.user.id or 0}:{digest}"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        facet_fields = getattr(view, 'facet_fields', ())
+        cache_key = self.get_facet_cache_key(request, view)
+        self.facets = cache.get(cache_key) if facet_fields else {}
+
+        if self.facets is None:
+            for field in facet_fields:
+                queryset = queryset.facet(field)
+
+        page = super().paginate_queryset(queryset, request, view)
+
+        if self.facets is None:
+            counts = queryset.facet_counts().get('fields', {})
+            self.facets = { field: [ {'value': value, 'count': count} for value, count in counts.get(field, ()) ] for field in facet_fields }
+            cache.set(cache_key, self.facets, self.facet_cache_timeout)
+
+        if page is not None:
+            page = [ result for result in page if result is not None and result.object is not None ]
+
+        return page
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data['facets'] = self.facets
+
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['facets'] = {
+            'type': 'object',
+            'additionalProperties': {
+                'type': 'array',
+                'items': {
+                    'type': 'object',
+                    'properties': {
+                        'value': {'type': 'string'},
+                        'count': {'type': 'integer'},
+                    },
+                },
+            },
+        }
+
+        return response_schema
 
 
 class CommentPagination(CursorPagination):
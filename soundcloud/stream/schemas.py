@@ -0,0 +1,19 @@
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, OpenApiResponse, extend_schema_view, extend_schema
+from stream.serializers import StreamSerializer
+
+
+stream_schema = extend_schema_view(
+    get=extend_schema(
+        summary="Get My Stream",
+        description="Tracks, sets and reposts of the followings, newest first. Follow 'next' for the older ones.",
+        parameters=[
+            OpenApiParameter("cursor", OpenApiTypes.STR, OpenApiParameter.QUERY, description='The pagination cursor value.'),
+            OpenApiParameter("page_size", OpenApiTypes.INT, OpenApiParameter.QUERY, description='Number of results to return per page.'),
+        ],
+        responses={
+            '200': OpenApiResponse(response=StreamSerializer(many=True), description='OK'),
+            '401': OpenApiResponse(description='Unauthorized'),
+        }
+    ),
+)
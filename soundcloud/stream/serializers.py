@@ -0,0 +1,35 @@
+from rest_framework import serializers
+from set.serializers import SimpleSetSerializer
+from stream.timeline import SET, SET_REPOST, TRACK, TRACK_REPOST
+from track.serializers import SimpleTrackSerializer
+from user.serializers import SimpleUserSerializer
+
+
+class StreamListSerializer(serializers.ListSerializer):
+    """
+    Resolves the viewer flags and user stats of the whole page before serializing the activities.
+    """
+
+    def to_representation(self, data):
+        activities = list(data)
+        fields = self.child.fields
+
+        for name in ('track', 'set'):
+            instances = [ getattr(activity, name) for activity in activities if getattr(activity, name) is not None ]
+            fields[name].resolve_viewer_relations(instances)
+            fields[name].resolve_user_stats(instances)
+        fields['user'].resolve_viewer_relations([ activity.user for activity in activities ])
+
+        return super().to_representation(activities)
+
+
+class StreamSerializer(serializers.Serializer):
+
+    type = serializers.ChoiceField(choices=(TRACK, SET, TRACK_REPOST, SET_REPOST))
+    created_at = serializers.DateTimeField()
+    user = SimpleUserSerializer()
+    track = SimpleTrackSerializer(allow_null=True)
+    set = SimpleSetSerializer(allow_null=True)
+
+    class Meta:
+        list_serializer_class = StreamListSerializer
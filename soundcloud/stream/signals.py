@@ -0,0 +1,47 @@
+"""
+Keeps the home stream timelines up to date, see 'stream.timeline'.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from reaction.models import Repost
+from set.models import Set
+from stream import timeline
+from track.models import Track
+from user.models import Follow
+
+
+@receiver(post_save, sender=Track)
+def push_track(sender, instance, created, **kwargs):
+    if created and not instance.is_private:
+        transaction.on_commit(lambda: timeline.push(timeline.TRACK, instance.id, instance.artist_id, instance.created_at))
+
+
+@receiver(post_save, sender=Set)
+def push_set(sender, instance, created, **kwargs):
+    if created and not instance.is_private:
+        transaction.on_commit(lambda: timeline.push(timeline.SET, instance.id, instance.creator_id, instance.created_at))
+
+
+@receiver(post_save, sender=Repost)
+def push_repost(sender, instance, created, **kwargs):
+    if created:
+        type = timeline.get_repost_type(instance.content_type_id)
+        transaction.on_commit(lambda: timeline.push(type, instance.object_id, instance.user_id, instance.created_at))
+
+
+@receiver(post_delete, sender=Repost)
+def remove_repost(sender, instance, **kwargs):
+    type = timeline.get_repost_type(instance.content_type_id)
+    transaction.on_commit(lambda: timeline.remove(type, instance.object_id, instance.user_id))
+
+
+@receiver(post_save, sender=Follow)
+def backfill_followee(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: timeline.backfill(instance.follower_id, instance.followee_id))
+
+
+@receiver(post_delete, sender=Follow)
+def purge_followee(sender, instance, **kwargs):
+    transaction.on_commit(lambda: timeline.purge(instance.follower_id, instance.followee_id))
@@ -0,0 +1,227 @@
+"""
+Home stream: per-user timelines of the followings' tracks, sets and reposts, kept in Redis sorted sets.
+
+Activities are fanned out to the timelines of the followers when they are created (see 'stream.signals'),
+except for the users with more than settings.STREAM_FANOUT_LIMIT followers: their activities are pulled
+from the database when the stream is read. A timeline is built from the database on its first read.
+"""
+from collections import namedtuple
+from datetime import datetime, timezone
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Q
+from django_redis import get_redis_connection
+from reaction.models import Repost
+from set.models import Set
+from track.models import Track
+from user.models import Follow, User
+
+TRACK = 'track'
+SET = 'set'
+TRACK_REPOST = 'track-repost'
+SET_REPOST = 'set-repost'
+
+PULL_KEY = 'stream:pull'    # ids of the users whose activities are pulled at read time
+
+TIMELINE_TIMEOUT = 60 * 60 * 24
+
+# Member of every built timeline, so that an empty stream is not rebuilt on every read.
+# Its score is above every activity, so that trimming never drops it.
+LOADED = 'loaded'
+
+Activity = namedtuple('Activity', ('type', 'created_at', 'user', 'track', 'set'))
+
+# KEYS: timelines of the followers
+# ARGV: score, member, max length (with LOADED)
+PUSH_SCRIPT = """
+for i, key in ipairs(KEYS) do
+    if redis.call('EXISTS', key) == 1 then
+        redis.call('ZADD', key, ARGV[1], ARGV[2])
+        redis.call('ZREMRANGEBYRANK', key, 0, -tonumber(ARGV[3]) - 1)
+    end
+end
+"""
+
+# KEYS: timeline
+# ARGV: max score, count
+# Returns the entries from the max score down, including all the entries tied with it.
+RANGE_SCRIPT = """
+local ties = redis.call('ZCOUNT', KEYS[1], ARGV[1], ARGV[1])
+return redis.call('ZREVRANGEBYSCORE', KEYS[1], ARGV[1], '-inf', 'WITHSCORES', 'LIMIT', 0, tonumber(ARGV[2]) + ties)
+"""
+
+
+def get_timeline_key(user_id):
+    return f"stream:{user_id}"
+
+
+def get_member(type, object_id, actor_id):
+    return f"{type}:{object_id}:{actor_id}"
+
+
+def parse_member(member):
+    type, object_id, actor_id = member.split(':')
+
+    return type, int(object_id), int(actor_id)
+
+
+def get_repost_type(content_type_id):
+    model = ContentType.objects.get_for_id(content_type_id).model_class()
+
+    return TRACK_REPOST if model is Track else SET_REPOST
+
+
+def _get_follower_keys(actor_id):
+    """
+    Returns the timeline keys of the followers, or None if the actor's activities are to be pulled.
+    """
+    connection = get_redis_connection('default')
+    follower_ids = list(Follow.objects.filter(followee_id=actor_id).values_list('follower_id', flat=True)[:settings.STREAM_FANOUT_LIMIT + 1])
+
+    if len(follower_ids) > settings.STREAM_FANOUT_LIMIT:
+        connection.sadd(PULL_KEY, actor_id)
+        return None
+
+    connection.srem(PULL_KEY, actor_id)
+    return [ get_timeline_key(follower_id) for follower_id in follower_ids ]
+
+
+def push(type, object_id, actor_id, created_at):
+    """
+    Adds the activity to the built timelines of the actor's followers, in a single round trip.
+    """
+    keys = _get_follower_keys(actor_id)
+    if keys:
+        script = get_redis_connection('default').register_script(PUSH_SCRIPT)
+        script(keys=keys, args=[created_at.timestamp(), get_member(type, object_id, actor_id), settings.STREAM_LENGTH + 1])
+
+
+def remove(type, object_id, actor_id):
+    keys = _get_follower_keys(actor_id)
+    if keys:
+        pipeline = get_redis_connection('default').pipeline(transaction=False)
+        for key in keys:
+            pipeline.zrem(key, get_member(type, object_id, actor_id))
+        pipeline.execute()
+
+
+def fetch_activities(actor_ids, before=None, limit=None):
+    """
+    Returns the latest activities of the actors from the database, as [(score, member), ...].
+    """
+    limit = limit or settings.STREAM_LENGTH
+    actor_ids = list(actor_ids)
+    if not actor_ids:
+        return []
+
+    at = Q() if before is None else Q(created_at__lte=datetime.fromtimestamp(before, tz=timezone.utc))
+    tracks = Track._base_manager.filter(at, artist_id__in=actor_ids, is_private=False) \
+        .order_by('-created_at').values_list('id', 'artist_id', 'created_at')[:limit]
+    sets = Set._base_manager.filter(at, creator_id__in=actor_ids, is_private=False) \
+        .order_by('-created_at').values_list('id', 'creator_id', 'created_at')[:limit]
+    reposts = Repost.objects.filter(at, user_id__in=actor_ids) \
+        .order_by('-created_at').values_list('content_type_id', 'object_id', 'user_id', 'created_at')[:limit]
+
+    activities = [ (created_at.timestamp(), get_member(TRACK, id, actor_id)) for id, actor_id, created_at in tracks ]
+    activities += [ (created_at.timestamp(), get_member(SET, id, actor_id)) for id, actor_id, created_at in sets ]
+    activities += [
+        (created_at.timestamp(), get_member(get_repost_type(content_type_id), id, actor_id))
+        for content_type_id, id, actor_id, created_at in reposts
+    ]
+
+    return sorted(activities, reverse=True)[:limit]
+
+
+def _get_pull_ids():
+    return { int(id) for id in get_redis_connection('default').smembers(PULL_KEY) }
+
+
+def build(user_id):
+    """
+    Fills the user's timeline from the database.
+    """
+    followee_ids = set(Follow.objects.filter(follower_id=user_id).values_list('followee_id', flat=True)) - _get_pull_ids()
+    activities = fetch_activities(followee_ids)
+    key = get_timeline_key(user_id)
+
+    pipeline = get_redis_connection('default').pipeline()
+    pipeline.zadd(key, { LOADED: '+inf', **{ member: score for score, member in activities } })
+    pipeline.zremrangebyrank(key, 0, -settings.STREAM_LENGTH - 2)
+    pipeline.expire(key, TIMELINE_TIMEOUT)
+    pipeline.execute()
+
+
+def backfill(user_id, followee_id):
+    """
+    Adds the latest activities of a new followee to the user's timeline, if it is built.
+    """
+    connection = get_redis_connection('default')
+    key = get_timeline_key(user_id)
+    if not connection.exists(key) or followee_id in _get_pull_ids():
+        return
+
+    activities = fetch_activities([followee_id])
+    if activities:
+        pipeline = connection.pipeline(transaction=False)
+        pipeline.zadd(key, { member: score for score, member in activities })
+        pipeline.zremrangebyrank(key, 0, -settings.STREAM_LENGTH - 2)
+        pipeline.execute()
+
+
+def purge(user_id, followee_id):
+    """
+    Removes the activities of an unfollowed user from the user's timeline.
+    """
+    connection = get_redis_connection('default')
+    key = get_timeline_key(user_id)
+    members = [ member for member in connection.zrange(key, 0, -1) if member.decode() != LOADED and parse_member(member.decode())[2] == followee_id ]
+
+    if members:
+        connection.zrem(key, *members)
+
+
+def read(user_id, position=None, count=None):
+    """
+    Returns up to {count} (score, member) of the user's stream after the position, newest first.
+    """
+    connection = get_redis_connection('default')
+    key = get_timeline_key(user_id)
+    if not connection.exists(key):
+        build(user_id)
+
+    score, member = position if position is not None else ('+inf', None)
+    entries = connection.register_script(RANGE_SCRIPT)(keys=[key], args=[score, count])
+    entries = [ (float(score), member.decode()) for member, score in zip(entries[::2], entries[1::2]) if member.decode() != LOADED ]
+
+    pull_ids = _get_pull_ids()
+    if pull_ids:
+        followee_ids = Follow.objects.filter(follower_id=user_id, followee_id__in=pull_ids).values_list('followee_id', flat=True)
+        entries += fetch_activities(followee_ids, before=position and position[0], limit=count)
+
+    if position is not None:
+        entries = [ entry for entry in entries if entry[0] < position[0] or (entry[0] == position[0] and entry[1] < position[1]) ]
+
+    return sorted(set(entries), reverse=True)[:count]
+
+
+def get_activities(entries, user):
+    """
+    Loads the objects of the entries in bulk, skipping the ones that were deleted or made private since.
+    """
+    parsed = [ (score, *parse_member(member)) for score, member in entries ]
+    user_id = getattr(user, 'id', None)
+
+    track_ids = { object_id for _, type, object_id, _ in parsed if type in (TRACK, TRACK_REPOST) }
+    set_ids = { object_id for _, type, object_id, _ in parsed if type in (SET, SET_REPOST) }
+    tracks = Track.objects.filter(id__in=track_ids).exclude(~Q(artist_id=user_id) & Q(is_private=True)).in_bulk()
+    sets = Set.objects.filter(id__in=set_ids).exclude(~Q(creator_id=user_id) & Q(is_private=True)).in_bulk()
+    users = User.objects.filter(id__in={ actor_id for *_, actor_id in parsed }).with_stats('follower_count', 'track_count').in_bulk()
+
+    activities = []
+    for score, type, object_id, actor_id in parsed:
+        track = tracks.get(object_id) if type in (TRACK, TRACK_REPOST) else None
+        set = sets.get(object_id) if type in (SET, SET_REPOST) else None
+        if (track or set) and actor_id in users:
+            activities.append(Activity(type, datetime.fromtimestamp(score, tz=timezone.utc), users[actor_id], track, set))
+
+    return activities
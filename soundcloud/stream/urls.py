@@ -0,0 +1,7 @@
+from django.urls import path
+from stream.views import UserStreamView
+
+
+urlpatterns = [
+    path('users/me/stream', UserStreamView.as_view(), name='user-stream'),  # /users/me/stream
+]
@@ -0,0 +1,62 @@
+import json
+from rest_framework.exceptions import NotFound
+from rest_framework.generics import GenericAPIView
+from rest_framework.pagination import Cursor, CursorPagination
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from stream import timeline
+from stream.schemas import stream_schema
+from stream.serializers import StreamSerializer
+
+
+class StreamPagination(CursorPagination):
+    """
+    Keyset pagination on the (score, member) of the timeline entries.
+    """
+
+    page_size_query_param = 'page_size'
+
+    def paginate_stream(self, user, request):
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+
+        position = None
+        if self.cursor is not None and self.cursor.position is not None:
+            try:
+                score, member = json.loads(self.cursor.position)
+                position = (float(score), str(member))
+            except (TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+
+        entries = timeline.read(user.id, position, self.page_size + 1)
+        self.has_next = len(entries) > self.page_size
+        self.last = entries[self.page_size - 1] if self.has_next else None
+
+        return timeline.get_activities(entries[:self.page_size], user)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=json.dumps(self.last)))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+
+@stream_schema
+class UserStreamView(GenericAPIView):
+
+    serializer_class = StreamSerializer
+    pagination_class = StreamPagination
+    permission_classes = (IsAuthenticated, )
+
+    def get(self, request, *args, **kwargs):
+        activities = self.paginator.paginate_stream(request.user, request)
+        serializer = self.get_serializer(activities, many=True)
+
+        return self.get_paginated_response(serializer.data)
@@ -0,0 +1,314 @@
+"""
+Write-behind buffer for track and set hits.
+
+With settings.TRACK_HIT_BUFFER enabled, a hit only costs a single Redis round trip:
+the pending counts are kept in Redis hashes and applied to TrackHit/SetHit in bulk
+by the 'flush_hits' command.
+"""
+from datetime import datetime, timezone
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import DateTimeField, F, Q, Value
+from django.db.models.functions import Greatest
+from django_redis import get_redis_connection
+from set.models import SetHit, SetTrack
+from track.models import Track, TrackHit
+from user.models import User
+
+HIT_TIMEOUT = 300
+
+# Hits sent later than this by offline clients are ignored
+LATE_HIT_WINDOW = 24 * 60 * 60
+
+TRACK_HITS_KEY = 'hits:track'           # "{user_id}:{track_id}" -> pending count
+TRACK_LAST_HITS_KEY = 'hits:track:last' # "{user_id}:{track_id}" -> timestamp of the last hit
+SET_HITS_KEY = 'hits:set'               # "{user_id}:{set_id}:{track_id}" -> timestamp of the last hit
+BUFFER_KEYS = (TRACK_HITS_KEY, TRACK_LAST_HITS_KEY, SET_HITS_KEY,)
+FLUSHING_SUFFIX = ':flushing'
+FLUSH_LOCK_KEY = 'hits:flush:lock'
+FLUSH_LOCK_TIMEOUT = 600
+
+# Hit rows looked up per query when applying the buffers
+LOOKUP_BATCH_SIZE = 200
+
+# KEYS: dedup key, *BUFFER_KEYS
+# ARGV: dedup timeout, track field, timestamp, set field ('' if none)
+BUFFER_HIT_SCRIPT = """
+local counted = redis.call('SET', KEYS[1], 1, 'NX', 'EX', ARGV[1])
+if counted then
+    redis.call('HINCRBY', KEYS[2], ARGV[2], 1)
+end
+redis.call('HSET', KEYS[3], ARGV[2], ARGV[3])
+if ARGV[4] ~= '' then
+    redis.call('HSET', KEYS[4], ARGV[4], ARGV[3])
+end
+return counted and 1 or 0
+"""
+
+# KEYS: *BUFFER_KEYS
+# ARGV: number of tracks, (track field, count, timestamp) of each track, then (set field, timestamp) of each set
+BUFFER_HITS_SCRIPT = """
+local function set_latest(key, field, value)
+    local current = redis.call('HGET', key, field)
+    if not current or tonumber(current) < tonumber(value) then
+        redis.call('HSET', key, field, value)
+    end
+end
+local track_count = tonumber(ARGV[1])
+for i = 2, 1 + track_count * 3, 3 do
+    if tonumber(ARGV[i + 1]) > 0 then
+        redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1])
+    end
+    set_latest(KEYS[2], ARGV[i], ARGV[i + 2])
+end
+for i = 2 + track_count * 3, #ARGV, 2 do
+    set_latest(KEYS[3], ARGV[i], ARGV[i + 1])
+end
+"""
+
+# Moves the buffers aside, unless the previous flush has left them unapplied.
+TAKE_BUFFERS_SCRIPT = """
+local buffers = {}
+for i, key in ipairs(KEYS) do
+    local flushing = key .. ARGV[1]
+    if redis.call('EXISTS', flushing) == 0 and redis.call('EXISTS', key) == 1 then
+        redis.call('RENAME', key, flushing)
+    end
+    buffers[i] = redis.call('HGETALL', flushing)
+end
+return buffers
+"""
+
+
+def get_hit_key(client_ip, user_id, track_id):
+    """
+    Cache key of the dedup flag: a hit is counted once per (ip, user, track) for HIT_TIMEOUT seconds.
+    """
+    return f"{client_ip}_user_{user_id}_track_{track_id}"
+
+
+def _encode_id(id):
+    return '' if id is None else str(id)
+
+
+def _decode_id(value):
+    return int(value) if value else None
+
+
+def buffer_hit(client_ip, user_id, track_id, set_id=None, hit_at=None):
+    """
+    Records a hit in Redis and returns whether it is counted.
+    """
+    connection = get_redis_connection('default')
+    script = connection.register_script(BUFFER_HIT_SCRIPT)
+    hit_at = hit_at or datetime.now(timezone.utc)
+    track_field = f"{_encode_id(user_id)}:{track_id}"
+    set_field = f"{_encode_id(user_id)}:{set_id}:{track_id}" if set_id is not None else ''
+
+    counted = script(
+        keys=[cache.make_key(get_hit_key(client_ip, user_id, track_id)), *BUFFER_KEYS],
+        args=[HIT_TIMEOUT, track_field, hit_at.timestamp(), set_field],
+    )
+
+    return bool(counted)
+
+
+def claim_hits(client_ip, user_id, track_ids):
+    """
+    Sets the dedup flags of the tracks in a single pipeline. Returns the ids of the tracks whose hit is counted.
+    """
+    track_ids = list(track_ids)
+    pipeline = get_redis_connection('default').pipeline(transaction=False)
+    for track_id in track_ids:
+        pipeline.set(cache.make_key(get_hit_key(client_ip, user_id, track_id)), 1, nx=True, ex=HIT_TIMEOUT)
+
+    return { track_id for track_id, counted in zip(track_ids, pipeline.execute()) if counted }
+
+
+def claim_late_hits(client_ip, user_id, buckets):
+    """
+    Sets the dedup flags of hits played before the last HIT_TIMEOUT seconds, one per (track_id, HIT_TIMEOUT bucket),
+    so that sending them again doesn't count them again. Returns the claimed (track_id, bucket).
+    """
+    buckets = list(buckets)
+    pipeline = get_redis_connection('default').pipeline(transaction=False)
+    for track_id, bucket in buckets:
+        key = f"{get_hit_key(client_ip, user_id, track_id)}_at_{bucket}"
+        pipeline.set(cache.make_key(key), 1, nx=True, ex=LATE_HIT_WINDOW + HIT_TIMEOUT)
+
+    return { bucket for bucket, counted in zip(buckets, pipeline.execute()) if counted }
+
+
+def buffer_hits(counts, last_hits, set_last_hits):
+    """
+    Adds counted hits to the Redis buffers in a single round trip, without moving the buffered last hits back.
+    Takes the arguments of 'apply_track_hits' and 'apply_set_hits'.
+    """
+    args = []
+    track_keys = set(counts) | set(last_hits)
+    for user_id, track_id in track_keys:
+        hit_at = last_hits.get((user_id, track_id)) or datetime.now(timezone.utc)
+        args += [f"{_encode_id(user_id)}:{track_id}", counts.get((user_id, track_id), 0), hit_at.timestamp()]
+    for (user_id, set_id, track_id), hit_at in set_last_hits.items():
+        args += [f"{_encode_id(user_id)}:{set_id}:{track_id}", hit_at.timestamp()]
+
+    if args:
+        script = get_redis_connection('default').register_script(BUFFER_HITS_SCRIPT)
+        script(keys=BUFFER_KEYS, args=[len(track_keys), *args])
+
+
+def _parse(buffer, field_count):
+    """
+    Flat [field, value, ...] reply of HGETALL -> { (id, ...): value }
+    """
+    parsed = {}
+    for field, value in zip(buffer[::2], buffer[1::2]):
+        ids = field.decode().split(':')
+        if len(ids) == field_count:
+            parsed[tuple(_decode_id(id) for id in ids)] = value
+
+    return parsed
+
+
+def _timestamp(value):
+    return datetime.fromtimestamp(float(value), tz=timezone.utc)
+
+
+def _bulk_get_or_create(model, key_fields, keys, create):
+    """
+    Returns { key: row } for the keys, inserting the missing rows in bulk, and the keys of the inserted rows.
+    Only the rows of the keys are read, LOOKUP_BATCH_SIZE keys per query.
+    Rows are looked up before inserting, since the unique constraints don't cover anonymous (NULL) users.
+    """
+    def fetch(keys):
+        rows = {}
+        for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+            condition = Q()
+            for key in keys[start:start + LOOKUP_BATCH_SIZE]:
+                condition |= Q(**dict(zip(key_fields, key)))
+            for row in model.objects.filter(condition):
+                rows.setdefault(tuple(getattr(row, field) for field in key_fields), row)
+
+        return rows
+
+    keys = list(keys)
+    rows = fetch(keys)
+
+    missing = [ key for key in keys if key not in rows ]
+    if missing:
+        model.objects.bulk_create([ create(key) for key in missing ], ignore_conflicts=True)
+        rows.update(fetch(missing))
+
+    return { key: rows[key] for key in keys if key in rows }, set(missing)
+
+
+def _last_hit(hit_at, created):
+    """
+    Never moves the last hit of an existing row back, e.g. for plays sent late by offline clients.
+    """
+    if created:
+        return hit_at
+
+    return Greatest(F('last_hit'), Value(hit_at, output_field=DateTimeField()))
+
+
+def apply_track_hits(counts, last_hits):
+    """
+    Applies { (user_id, track_id): count } and { (user_id, track_id): datetime } to TrackHit
+    with a constant number of queries, and adds the counts to Track.play_count.
+    """
+    keys = set(counts) | set(last_hits)
+    track_ids = set(Track._base_manager.filter(id__in={ track_id for _, track_id in keys }).values_list('id', flat=True))
+    user_ids = set(User._base_manager.filter(id__in={ user_id for user_id, _ in keys }).values_list('id', flat=True)) | {None}
+    keys = { (user_id, track_id) for user_id, track_id in keys if track_id in track_ids and user_id in user_ids }
+
+    if not keys:
+        return 0
+
+    track_hits, created = _bulk_get_or_create(
+        TrackHit,
+        ('user_id', 'track_id'),
+        keys,
+        lambda key: TrackHit(user_id=key[0], track_id=key[1]),
+    )
+
+    play_counts = {}
+    for key, track_hit in track_hits.items():
+        count = counts.get(key, 0)
+        track_hit.count = F('count') + count
+        track_hit.last_hit = _last_hit(last_hits.get(key) or datetime.now(timezone.utc), key in created)
+        play_counts[track_hit.track_id] = play_counts.get(track_hit.track_id, 0) + count
+
+    TrackHit.objects.bulk_update(track_hits.values(), ['count', 'last_hit'], batch_size=500)
+
+    tracks = [ Track(id=track_id, play_count=F('play_count') + count) for track_id, count in play_counts.items() if count ]
+    Track._base_manager.bulk_update(tracks, ['play_count'], batch_size=500)
+
+    return len(track_hits)
+
+
+def apply_set_hits(last_hits):
+    """
+    Applies { (user_id, set_id, track_id): datetime } to SetHit, skipping tracks that are not in the set.
+    """
+    set_tracks = set(SetTrack.objects.filter(
+        set_id__in={ set_id for _, set_id, _ in last_hits },
+        track_id__in={ track_id for _, _, track_id in last_hits },
+    ).values_list('set_id', 'track_id'))
+    user_ids = set(User._base_manager.filter(id__in={ user_id for user_id, _, _ in last_hits }).values_list('id', flat=True)) | {None}
+
+    latest = {}
+    for (user_id, set_id, track_id), hit_at in last_hits.items():
+        if (set_id, track_id) in set_tracks and user_id in user_ids:
+            latest[(user_id, set_id)] = max(hit_at, latest.get((user_id, set_id), hit_at))
+
+    if not latest:
+        return 0
+
+    set_hits, created = _bulk_get_or_create(
+        SetHit,
+        ('user_id', 'set_id'),
+        latest.keys(),
+        lambda key: SetHit(user_id=key[0], set_id=key[1]),
+    )
+    for key, set_hit in set_hits.items():
+        set_hit.last_hit = _last_hit(latest[key], key in created)
+
+    SetHit.objects.bulk_update(set_hits.values(), ['last_hit'], batch_size=500)
+
+    return len(set_hits)
+
+
+def flush_hits():
+    """
+    Applies the buffered hits to the database. Returns the number of (track hit, set hit) rows written,
+    or None if another flush is running, since both would apply the same buffers.
+    If applying fails, the buffers are kept and retried by the next flush.
+    """
+    lock = cache.lock(FLUSH_LOCK_KEY, timeout=FLUSH_LOCK_TIMEOUT)
+    if not lock.acquire(blocking=False):
+        return None
+
+    try:
+        return _flush_hits()
+    finally:
+        lock.release()
+
+
+def _flush_hits():
+    connection = get_redis_connection('default')
+    take_buffers = connection.register_script(TAKE_BUFFERS_SCRIPT)
+    track_counts, track_last_hits, set_last_hits = take_buffers(keys=BUFFER_KEYS, args=[FLUSHING_SUFFIX])
+
+    with transaction.atomic():
+        track_hit_count = apply_track_hits(
+            { key: int(value) for key, value in _parse(track_counts, 2).items() },
+            { key: _timestamp(value) for key, value in _parse(track_last_hits, 2).items() },
+        )
+        set_hit_count = apply_set_hits(
+            { key: _timestamp(value) for key, value in _parse(set_last_hits, 3).items() },
+        )
+
+    connection.delete(*[ key + FLUSHING_SUFFIX for key in BUFFER_KEYS ])
+
+    return track_hit_count, set_hit_count
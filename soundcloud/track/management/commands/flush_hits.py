@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand
+from track.hits import flush_hits
+
+
+class Command(BaseCommand):
+    help = "Applies the track/set hits buffered in redis to the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=None, help="Keep flushing every INTERVAL seconds.")
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+
+        while True:
+            flushed = flush_hits()
+            if flushed is None:
+                self.stdout.write("Another flush is running, skipped.")
+            else:
+                self.stdout.write("Flushed {} track hit(s), {} set hit(s).".format(*flushed))
+
+            if interval is None:
+                break
+            time.sleep(interval)
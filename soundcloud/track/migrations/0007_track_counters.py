@@ -0,0 +1,65 @@
+# Generated by Django 3.2.6 on 2026-10-17 00:48
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def aggregate_of(queryset, field_name, aggregate):
+    subquery = queryset.filter(**{field_name: OuterRef('pk')}).order_by().values(field_name).annotate(value=aggregate).values('value')
+
+    return Coalesce(Subquery(subquery, output_field=IntegerField()), 0)
+
+
+def populate_counters(apps, schema_editor):
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Track = apps.get_model('track', 'Track')
+    TrackHit = apps.get_model('track', 'TrackHit')
+    Like = apps.get_model('reaction', 'Like')
+    Repost = apps.get_model('reaction', 'Repost')
+    Comment = apps.get_model('comment', 'Comment')
+    content_type = ContentType.objects.filter(app_label='track', model='track').first()
+
+    Track.objects.update(
+        play_count=aggregate_of(TrackHit.objects.all(), 'track', Sum('count')),
+        comment_count=aggregate_of(Comment.objects.all(), 'track', Count('*')),
+    )
+    if content_type is not None:
+        Track.objects.update(
+            like_count=aggregate_of(Like.objects.filter(content_type=content_type), 'object_id', Count('*')),
+            repost_count=aggregate_of(Repost.objects.filter(content_type=content_type), 'object_id', Count('*')),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('reaction', '0003_auto_20211226_1111'),
+        ('comment', '0006_auto_20220106_0846'),
+        ('track', '0006_auto_20220122_1003'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='track',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='play_count',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='repost_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.6 on 2026-10-17 01:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('track', '0007_track_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='track',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -1,32 +1,19 @@
 from django.db import models
-from django.db.models import Sum, Count
-from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.fields import GenericRelation
 from reaction.models import Like, Repost
-from soundcloud.utils import assign_object_perms
+from soundcloud.counters import CounterMixin
 from tag.models import Tag
 
 
 class CustomTrackManager(models.Manager):
 
-    def create(self, **kwargs):
-        instance = super().create(**kwargs)
-        assign_object_perms(instance.artist, instance)
-
-        return instance
-
     def get_queryset(self):
 
-        return super().get_queryset().select_related('artist', 'genre').prefetch_related('tags').annotate(
-                play_count=Coalesce(Sum('trackhit__count', distinct=True), 0),                              #  https://stackoverflow.com/a/35413920/14971231
-                like_count=Count('likes', distinct=True),
-                repost_count=Count('reposts', distinct=True),
-                comment_count=Count('comments', distinct=True),
-        )
+        return super().get_queryset().select_related('artist', 'genre').prefetch_related('tags')
 
 
-class Track(models.Model):
+class Track(CounterMixin, models.Model):
     title = models.CharField(max_length=100)
     artist = models.ForeignKey(get_user_model(), related_name="owned_tracks", on_delete=models.CASCADE)
     permalink = models.SlugField(max_length=255)
@@ -34,6 +21,7 @@ class Track(models.Model):
     image = models.URLField(null=True, unique=True)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     genre = models.ForeignKey(Tag, related_name="genre_tracks", null=True, on_delete=models.SET_NULL)
     tags = models.ManyToManyField(Tag, related_name="tag_tracks")
     is_private = models.BooleanField(default=False)
@@ -41,6 +29,17 @@ class Track(models.Model):
     likes = GenericRelation(Like, related_query_name="track")
     reposts = GenericRelation(Repost, related_query_name="track")
 
+    # Denormalized counters, kept in sync by the services. (see 'reconcile_counters' command)
+    play_count = models.BigIntegerField(default=0)
+    like_count = models.PositiveIntegerField(default=0)
+    repost_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+
+    counter_fields = ('play_count', 'like_count', 'repost_count', 'comment_count',)
+
+    # User allowed to change and delete the track. (see 'OwnershipBackend')
+    owner_field = 'artist'
+
     objects = CustomTrackManager()
 
     class Meta:
@@ -1,6 +1,6 @@
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import OpenApiParameter, OpenApiResponse, OpenApiExample, extend_schema, extend_schema_view
-from track.serializers import SimpleTrackSerializer, TrackSerializer, TrackMediaUploadSerializer
+from track.serializers import SimpleTrackSerializer, TrackHitEventSerializer, TrackSerializer, TrackMediaUploadSerializer
 from user.serializers import SimpleUserSerializer
 
 
@@ -85,7 +85,16 @@ tracks_viewset_schema = extend_schema_view(
         responses={
             '200': OpenApiResponse(description='OK'),
         }
-    )
+    ),
+    hits=extend_schema(
+        summary="Hit Tracks in Bulk",
+        description="Records up to 500 plays at once, e.g. the plays buffered by an offline client. Hits on hidden tracks or sets are ignored.",
+        request=TrackHitEventSerializer(many=True),
+        responses={
+            '200': OpenApiResponse(description='OK'),
+            '400': OpenApiResponse(description='Bad Request'),
+        }
+    ),
 )
 
 track_search_schema=extend_schema_view(
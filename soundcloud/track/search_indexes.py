@@ -5,13 +5,25 @@ from track.models import Track
 class TrackIndex(indexes.SearchIndex, indexes.Indexable):
     text = indexes.EdgeNgramField(document=True, use_template=True, template_name='search/track_text.txt')
     track_id = indexes.IntegerField(model_attr='id')
-    genre_name = indexes.CharField(model_attr='genre__name')
-    artist = indexes.CharField(model_attr='artist')
+    genre_name = indexes.CharField(model_attr='genre__name', faceted=True)
+    genre_id = indexes.IntegerField(model_attr='genre_id', null=True)
+    artist_id = indexes.IntegerField(model_attr='artist_id')
+    title = indexes.CharField(model_attr='title', indexed=False)
+    artist_display_name = indexes.CharField(model_attr='artist__display_name', indexed=False)
     pub_date = indexes.DateTimeField(model_attr='created_at')
+    is_private = indexes.BooleanField(model_attr='is_private')
+    tags = indexes.MultiValueField(faceted=True)
 
     def get_model(self):
         return Track
 
+    def prepare_tags(self, obj):
+        return [ tag.name for tag in obj.tags.all() ]
+
     def index_queryset(self, using=None):
         """Used when the entire index for model is updated."""
         return self.get_model().objects.all()
+
+    def get_updated_field(self):
+        """Used by 'update_index --since' to only index the rows updated after the watermark."""
+        return 'updated_at'
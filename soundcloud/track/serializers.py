@@ -1,6 +1,8 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.db import transaction
-from django.db.models import F
+from django.db.models import F, Q
 from django.shortcuts import get_object_or_404
 from drf_haystack.serializers import HaystackSerializer, HaystackSerializerMixin
 from drf_spectacular.types import OpenApiTypes
@@ -8,19 +10,24 @@ from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers, status
 from rest_framework.validators import UniqueTogetherValidator
 from rest_framework.serializers import ValidationError
-from set.models import SetHit
-from soundcloud.utils import get_presigned_url, MediaUploadMixin
+from set.models import Set, SetHit
 from tag.models import Tag
 from tag.serializers import TagSerializer
+from track.hits import HIT_TIMEOUT, LATE_HIT_WINDOW, apply_set_hits, apply_track_hits, buffer_hit, buffer_hits, claim_hits, \
+    claim_late_hits, get_hit_key
 from track.models import Track, TrackHit
 from track.search_indexes import TrackIndex
-from user.models import Follow
 from user.serializers import UserSerializer, SimpleUserSerializer
-from reaction.models import Like, Repost
-from soundcloud.utils import get_presigned_url, MediaUploadMixin
+from soundcloud.counters import update_counter
+from soundcloud.utils import get_presigned_url, MediaUploadMixin, ViewerRelationListSerializer, ViewerRelationMixin
+from datetime import datetime, timezone
 
+User = get_user_model()
 
-class TrackSerializer(serializers.ModelSerializer):
+
+class TrackSerializer(ViewerRelationMixin, serializers.ModelSerializer):
+
+    followee_field = 'artist'
 
     artist = UserSerializer(default=serializers.CurrentUserDefault(), read_only=True)
     audio = serializers.SerializerMethodField()
@@ -70,6 +77,7 @@ class TrackSerializer(serializers.ModelSerializer):
         read_only_fields = (
             'created_at',
         )
+        list_serializer_class = ViewerRelationListSerializer
 
         # Since 'artist' is read-only field, ModelSerializer wouldn't generate UniqueTogetherValidator automatically.
         validators = [
@@ -86,41 +94,6 @@ class TrackSerializer(serializers.ModelSerializer):
     def get_image(self, track):
         return get_presigned_url(track.image, 'get_object')
     
-    @extend_schema_field(OpenApiTypes.BOOL)
-    def get_is_liked(self, track):
-        if self.context['request'].user.is_authenticated:
-            try:                	
-                Like.objects.get(user=self.context['request'].user, track=track)
-                return True
-            except Like.DoesNotExist:
-                return False
-        else: 
-            return False 
-
-    @extend_schema_field(OpenApiTypes.BOOL)
-    def get_is_reposted(self, track):
-        if self.context['request'].user.is_authenticated:
-            try:                	
-                Repost.objects.get(user=self.context['request'].user, track=track)
-                return True
-            except Repost.DoesNotExist:
-                return False
-        else: 
-            return False
-
-    @extend_schema_field(OpenApiTypes.BOOL)
-    def get_is_followed(self, track):
-        if self.context['request'].user.is_authenticated:
-            follower = self.context['request'].user
-            followee = track.artist
-            try:
-                Follow.objects.get(follower=follower, followee=followee)
-                return True
-            except Follow.DoesNotExist:
-                return False
-        else:
-            return False
-
     def validate_permalink(self, value):
         if not any(c.isalpha() for c in value):
             raise ValidationError("Permalink must contain at least one alphabetic character.")
@@ -145,6 +118,15 @@ class TrackSerializer(serializers.ModelSerializer):
 
         return data
 
+    def create(self, validated_data):
+        instance = super().create(validated_data)
+
+        # The request user only has the auth columns loaded, so load the whole row, with the new track counted,
+        # to be nested in the response.
+        instance.artist = User.objects.with_stats().get(pk=instance.artist_id)
+
+        return instance
+
 
 class TrackMediaUploadSerializer(MediaUploadMixin, TrackSerializer):
 
@@ -168,8 +150,9 @@ class TrackMediaUploadSerializer(MediaUploadMixin, TrackSerializer):
         return data
 
 
-class SimpleTrackSerializer(serializers.ModelSerializer):
-    
+class SimpleTrackSerializer(ViewerRelationMixin, serializers.ModelSerializer):
+
+    followee_field = 'artist'
     artist = SimpleUserSerializer(read_only=True)
     audio = serializers.SerializerMethodField()
     image = serializers.SerializerMethodField()
@@ -203,48 +186,14 @@ class SimpleTrackSerializer(serializers.ModelSerializer):
             'is_reposted',
             'is_followed',
         )
+        list_serializer_class = ViewerRelationListSerializer
 
     def get_audio(self, track):
         return get_presigned_url(track.audio, 'get_object')
 
     def get_image(self, track):
         return get_presigned_url(track.image, 'get_object')
-  
-    @extend_schema_field(OpenApiTypes.BOOL)
-    def get_is_liked(self, track):
-        if self.context['request'].user.is_authenticated:
-            try:                	
-                Like.objects.get(user=self.context['request'].user, track=track)
-                return True
-            except Like.DoesNotExist:
-                return False
-        else: 
-            return False
-
-    @extend_schema_field(OpenApiTypes.BOOL)
-    def get_is_reposted(self, track):
-        if self.context['request'].user.is_authenticated:
-            try:
-                Repost.objects.get(user=self.context['request'].user, track=track)
-                return True
-            except Repost.DoesNotExist:
-                return False
-        else:
-            return False
-    
-    @extend_schema_field(OpenApiTypes.BOOL)
-    def get_is_followed(self, track):
-        if self.context['request'].user.is_authenticated:
-            follower = self.context['request'].user
-            followee = track.artist
-            try:
-                Follow.objects.get(follower=follower, followee=followee)
-                return True
-            except Follow.DoesNotExist:
-                return False
-        else:
-            return False
-          
+
 
 class UserTrackSerializer(serializers.ModelSerializer):
 
@@ -293,7 +242,9 @@ class CommentTrackSerializer(serializers.ModelSerializer):
         )
 
 
-class TrackInSetSerializer(serializers.ModelSerializer):
+class TrackInSetSerializer(ViewerRelationMixin, serializers.ModelSerializer):
+
+    followee_field = 'artist'
     audio = serializers.SerializerMethodField()
     image = serializers.SerializerMethodField()
     artist_permalink = serializers.CharField(source='artist.permalink')
@@ -318,6 +269,7 @@ class TrackInSetSerializer(serializers.ModelSerializer):
             'is_reposted',
             'play_count',
         )
+        list_serializer_class = ViewerRelationListSerializer
 
     def get_audio(self, track):
         return get_presigned_url(track.audio, 'get_object')
@@ -325,63 +277,135 @@ class TrackInSetSerializer(serializers.ModelSerializer):
     def get_image(self, track):
         return get_presigned_url(track.image, 'get_object')
 
-    @extend_schema_field(OpenApiTypes.BOOL)
-    def get_is_liked(self, track):
-        if self.context['request'].user.is_authenticated:
-            try:                	
-                Like.objects.get(user=self.context['request'].user, track=track)
-                return True
-            except Like.DoesNotExist:
-                return False
-        else: 
-            return False 
-
-    @extend_schema_field(OpenApiTypes.BOOL)
-    def get_is_reposted(self, track):
-        if self.context['request'].user.is_authenticated:
-            try:                	
-                Repost.objects.get(user=self.context['request'].user, track=track)
-                return True
-            except Repost.DoesNotExist:
-                return False
-        else: 
-            return False 
+def get_client_ip(request):
+    '''get client's ip address from X_FORWARDED_FOR header'''
+    xff = request.META.get('HTTP_X_FORWARDED_FOR')
+    ip = xff.split(',')[0] if xff else request.META.get('REMOTE_ADDR')
+
+    return ip, bool(xff)
 
 
 class TrackHitService(serializers.Serializer):
 
     def get_client_ip(self):
-        '''get client's ip address from X_FORWARDED_FOR header'''
-        xff = self.context.get('request').META.get('HTTP_X_FORWARDED_FOR')
-        ip = xff.split(',')[0] if xff else self.context.get('request').META.get('REMOTE_ADDR')
-
-        return ip, bool(xff)
+        return get_client_ip(self.context.get('request'))
 
-    @transaction.atomic
     def execute(self):
         request_user = self.context.get('request').user
         user = request_user if request_user.is_authenticated else None
+        client_ip, xff = self.get_client_ip()
+        set_id = self.context.get('request').query_params.get('set_id')
+
+        if settings.TRACK_HIT_BUFFER:
+            if set_id is not None and not set_id.isdigit():
+                raise ValidationError("set_id must be an integer.")
+            buffer_hit(client_ip, getattr(user, 'id', None), self.instance.id, set_id)
+        else:
+            self.save_hit(user, client_ip, set_id)
+
+        return status.HTTP_200_OK, { 'client_ip': client_ip, 'xff': xff }
+
+    @transaction.atomic
+    def save_hit(self, user, client_ip, set_id):
         track = self.instance
         track_hit, _ = TrackHit.objects.get_or_create(user=user, track=track)
 
         # cache key consists of (1) client's ip address (2) user id (3) track id
-        client_ip, xff = self.get_client_ip()
-        key = f"{client_ip}_user_{getattr(user, 'id', None)}_track_{track.id}"
+        key = get_hit_key(client_ip, getattr(user, 'id', None), track.id)
 
         # update the track hit count only when the user didn't hit the track for last {timeout} seconds
         if not cache.get(key):
             track_hit.count = F('count') + 1
-            cache.set(key, True, timeout=300)
+            update_counter(track, 'play_count', 1)
+            cache.set(key, True, timeout=HIT_TIMEOUT)
         track_hit.save()
 
         # update the set hit if specified
-        set_id = self.context.get('request').query_params.get('set_id')
         if set_id is not None:
             set = get_object_or_404(track.sets, pk=set_id)
             set_hit, _ = SetHit.objects.get_or_create(user=user, set=set)
             set_hit.save()
 
-        return status.HTTP_200_OK, { 'client_ip': client_ip, 'xff': xff }
+
+class TrackHitsService(serializers.ListSerializer):
+
+    MAX_HITS = 500
+
+    def validate(self, data):
+        if len(data) > self.MAX_HITS:
+            raise ValidationError(f"At most {self.MAX_HITS} hits can be sent at once.")
+
+        return data
+
+    def execute(self):
+        request = self.context.get('request')
+        user = request.user if request.user.is_authenticated else None
+        user_id = getattr(user, 'id', None)
+        client_ip, xff = get_client_ip(request)
+        now = datetime.now(timezone.utc)
+        hits = [ dict(hit, played_at=min(hit.get('played_at') or now, now)) for hit in self.validated_data ]
+        hits = [ hit for hit in hits if (now - hit['played_at']).total_seconds() < LATE_HIT_WINDOW ]
+
+        # ignore the hits on hidden tracks and sets
+        track_ids = set(Track._base_manager \
+            .filter(id__in={ hit['track_id'] for hit in hits }) \
+            .exclude(~Q(artist=user) & Q(is_private=True)) \
+            .values_list('id', flat=True))
+        set_ids = set(Set._base_manager \
+            .filter(id__in={ hit['set_id'] for hit in hits if hit.get('set_id') is not None }) \
+            .exclude(~Q(creator=user) & Q(is_private=True)) \
+            .values_list('id', flat=True)) | {None}
+        hits = [ hit for hit in hits if hit['track_id'] in track_ids and hit.get('set_id') in set_ids ]
+
+        # a hit is counted once per {HIT_TIMEOUT} seconds: the recent ones with the dedup flags of the live hits,
+        # the older ones sent late by offline clients with a flag per {HIT_TIMEOUT} bucket, and among themselves
+        is_recent = lambda hit: (now - hit['played_at']).total_seconds() < HIT_TIMEOUT
+        get_bucket = lambda hit: (hit['track_id'], int(hit['played_at'].timestamp()) // HIT_TIMEOUT)
+        claimed = claim_hits(client_ip, user_id, { hit['track_id'] for hit in hits if is_recent(hit) })
+        claimed_buckets = claim_late_hits(client_ip, user_id, { get_bucket(hit) for hit in hits if not is_recent(hit) })
+        counts, last_hits, set_last_hits, counted_at = {}, {}, {}, {}
+        for hit in sorted(hits, key=lambda hit: hit['played_at']):
+            track_id, played_at = hit['track_id'], hit['played_at']
+            key = (user_id, track_id)
+
+            counted = track_id not in counted_at or (played_at - counted_at[track_id]).total_seconds() >= HIT_TIMEOUT
+            if counted and is_recent(hit):
+                counted = track_id in claimed
+                claimed.discard(track_id)
+            elif counted:
+                counted = get_bucket(hit) in claimed_buckets
+                claimed_buckets.discard(get_bucket(hit))
+
+            if counted:
+                counts[key] = counts.get(key, 0) + 1
+                counted_at[track_id] = played_at
+            last_hits[key] = played_at
+            if hit.get('set_id') is not None:
+                set_last_hits[(user_id, hit['set_id'], track_id)] = played_at
+
+        if settings.TRACK_HIT_BUFFER:
+            buffer_hits(counts, last_hits, set_last_hits)
+        else:
+            with transaction.atomic():
+                apply_track_hits(counts, last_hits)
+                apply_set_hits(set_last_hits)
+
+        return status.HTTP_200_OK, {
+            'client_ip': client_ip,
+            'xff': xff,
+            'counted': sum(counts.values()),
+            'ignored': len(self.validated_data) - len(hits),
+        }
+
+
+class TrackHitEventSerializer(serializers.Serializer):
+
+    track_id = serializers.IntegerField(min_value=1)
+    set_id = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+    played_at = serializers.DateTimeField(required=False)
+
+    class Meta:
+        list_serializer_class = TrackHitsService
 
 
 class TrackSearchSerializer(HaystackSerializerMixin, TrackSerializer):
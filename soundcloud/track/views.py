@@ -8,9 +8,9 @@ from rest_framework.decorators import action
 from rest_framework.filters import OrderingFilter
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
-from soundcloud.utils import CustomObjectPermissions
+from soundcloud.utils import CachedRetrieveMixin, CustomObjectPermissions, SearchPagination
 from track.models import Track
-from track.serializers import SimpleTrackSerializer, TrackHitService, TrackSerializer, TrackMediaUploadSerializer, TrackSearchSerializer
+from track.serializers import SimpleTrackSerializer, TrackHitEventSerializer, TrackHitService, TrackSerializer, TrackMediaUploadSerializer, TrackSearchSerializer
 from track.schemas import tracks_viewset_schema, track_search_schema
 from user.models import User
 from user.serializers import SimpleUserSerializer
@@ -18,7 +18,7 @@ from datetime import datetime
 
 
 @tracks_viewset_schema
-class TrackViewSet(viewsets.ModelViewSet):
+class TrackViewSet(CachedRetrieveMixin, viewsets.ModelViewSet):
 
     permission_classes = (CustomObjectPermissions, )
     filter_backends = (OrderingFilter, )
@@ -35,6 +35,8 @@ class TrackViewSet(viewsets.ModelViewSet):
             return SimpleUserSerializer
         if self.action in ['hit']:
             return TrackHitService
+        if self.action in ['hits']:
+            return TrackHitEventSerializer
 
         return TrackSerializer
 
@@ -43,19 +45,21 @@ class TrackViewSet(viewsets.ModelViewSet):
         # hide private tracks in the queryset
         user = self.request.user if self.request.user.is_authenticated else None
         queryset = Track.objects \
-            .exclude(~Q(artist=user) & Q(is_private=True)) \
-            .prefetch_related('artist__followers', 'artist__owned_tracks')
+            .exclude(~Q(artist=user) & Q(is_private=True))
 
         if self.action in ['likers', 'reposters']:
             self.track = getattr(self, 'track', None) or get_object_or_404(queryset, pk=self.kwargs[self.lookup_url_kwarg])
             querysets = {
-                'likers': User.objects.filter(likes__track=self.track),
-                'reposters': User.objects.filter(reposts__track=self.track),
+                'likers': User.objects.with_stats().filter(likes__track=self.track),
+                'reposters': User.objects.with_stats().filter(reposts__track=self.track),
             }
             return querysets.get(self.action)
 
         return queryset
 
+    def get_cache_dependencies(self, instance):
+        return [(User, instance.artist_id)]
+
     @action(detail=True)
     def likers(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
@@ -72,15 +76,25 @@ class TrackViewSet(viewsets.ModelViewSet):
 
         return Response(status=status, data=data)
 
+    @action(detail=False, methods=['POST'], permission_classes=(permissions.AllowAny, ))
+    def hits(self, request, *args, **kwargs):
+        service = self.get_serializer(data=request.data, many=True)
+        service.is_valid(raise_exception=True)
+        status, data = service.execute()
+
+        return Response(status=status, data=data)
+
 
 @track_search_schema
 class TrackSearchAPIView(ListModelMixin, HaystackGenericAPIView):
     index_models = [Track]
     serializer_class = TrackSearchSerializer
+    pagination_class = SearchPagination
+    facet_fields = ('genre_name', 'tags', )
 
     def get_queryset(self, index_models=[]):
         queryset = self.object_class()._clone()
-        queryset = queryset.models(*self.index_models)
+        queryset = queryset.models(*self.index_models).load_all()
 
         ids = self.request.GET.getlist('ids[]', None)
         genres = self.request.GET.getlist('genres[]', None)
@@ -99,9 +113,9 @@ class TrackSearchAPIView(ListModelMixin, HaystackGenericAPIView):
             q &= Q(pub_date__lte=datetime.strptime(end, '%Y-%m-%dT%H:%M:%S.%fZ'))
 
         if self.request.user.is_authenticated:
-            queryset = queryset.exclude(~Q(artist=self.request.user), is_private=True)
+            queryset = queryset.filter(Q(is_private=False) | Q(artist_id=self.request.user.id))
         else:
-            queryset = queryset.exclude(is_private=True)
+            queryset = queryset.filter(is_private=False)
 
         return queryset.filter(q)
 
@@ -0,0 +1,28 @@
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext as _
+from rest_framework import exceptions
+from rest_framework_jwt.authentication import JSONWebTokenAuthentication, jwt_get_username_from_payload
+
+User = get_user_model()
+
+
+class CustomJSONWebTokenAuthentication(JSONWebTokenAuthentication):
+    """
+    Loads the request user with only the columns needed on most requests.
+    """
+
+    def authenticate_credentials(self, payload):
+        username = jwt_get_username_from_payload(payload)
+
+        if not username:
+            raise exceptions.AuthenticationFailed(_('Invalid payload.'))
+
+        try:
+            user = User.objects.for_auth().get(**{User.USERNAME_FIELD: username})
+        except User.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid signature.'))
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User account is disabled.'))
+
+        return user
@@ -0,0 +1,103 @@
+"""
+Follow graph: the followings of every user as a Redis set, so that 'is_followed' flags don't touch the Follow table.
+
+A set is loaded from the database on its first read, and kept up to date by the follow signals (see 'user.signals').
+Every follow and unfollow bumps the version of the set, so that a load whose database read is older than
+a mutation doesn't overwrite it.
+"""
+from django.db import transaction
+from django_redis import get_redis_connection
+from user.models import Follow
+
+GRAPH_TIMEOUT = 60 * 60 * 24
+
+# Member of every loaded set, so that a user following nobody is not taken for a set to load
+LOADED = 'loaded'
+
+# Only adds to loaded sets: a missing set is loaded with the new following anyway.
+ADD_SCRIPT = """
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('SADD', KEYS[1], ARGV[1])
+end
+"""
+
+REMOVE_SCRIPT = """
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+redis.call('SREM', KEYS[1], ARGV[1])
+"""
+
+# Writes the set only if its version is still the one read before the database, in chunks for 'unpack'.
+LOAD_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '') ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+for i = 3, #ARGV, 1000 do
+    redis.call('SADD', KEYS[1], unpack(ARGV, i, math.min(i + 999, #ARGV)))
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+
+def get_followings_key(user_id):
+    return f"graph:followings:{user_id}"
+
+
+def get_version_key(user_id):
+    return f"graph:followings:{user_id}:version"
+
+
+def load_followings(user_id):
+    """
+    Writes the set of the user from the database, unless it was mutated meanwhile, and returns the ids of their followees.
+    """
+    connection = get_redis_connection('default')
+    version = connection.get(get_version_key(user_id)) or ''
+    followee_ids = set(Follow.objects.filter(follower_id=user_id).values_list('followee_id', flat=True))
+
+    connection.register_script(LOAD_SCRIPT)(
+        keys=[get_followings_key(user_id), get_version_key(user_id)],
+        args=[version, GRAPH_TIMEOUT, LOADED, *followee_ids],
+    )
+
+    return followee_ids
+
+
+def get_followed_ids(user_id, user_ids):
+    """
+    Returns the ids among user_ids that the user follows, with a single Redis round trip once their set is loaded.
+    """
+    user_ids = list(user_ids)
+    key = get_followings_key(user_id)
+
+    pipeline = get_redis_connection('default').pipeline()
+    pipeline.exists(key)
+    for id in user_ids:
+        pipeline.sismember(key, id)
+    loaded, *followed = pipeline.execute()
+
+    if not loaded:
+        followee_ids = load_followings(user_id)
+        return { id for id in user_ids if id in followee_ids }
+
+    return { id for id, is_followed in zip(user_ids, followed) if is_followed }
+
+
+def add_following(follower_id, followee_id):
+    def add():
+        connection = get_redis_connection('default')
+        connection.register_script(ADD_SCRIPT)(keys=[get_followings_key(follower_id), get_version_key(follower_id)], args=[followee_id, GRAPH_TIMEOUT])
+
+    transaction.on_commit(add)
+
+
+def remove_following(follower_id, followee_id):
+    def remove():
+        connection = get_redis_connection('default')
+        connection.register_script(REMOVE_SCRIPT)(keys=[get_followings_key(follower_id), get_version_key(follower_id)], args=[followee_id, GRAPH_TIMEOUT])
+
+    transaction.on_commit(remove)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from user.suggestions import BATCH_SIZE, SUGGESTION_COUNT, build_suggestions
+
+
+class Command(BaseCommand):
+    help = "Recomputes the users suggested to follow to every user."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=SUGGESTION_COUNT, help="Number of suggestions stored per user.")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Number of users written per transaction.")
+
+    def handle(self, *args, **options):
+        total = build_suggestions(options['count'], options['batch_size'])
+        self.stdout.write(f"Stored {total} suggestion(s).")
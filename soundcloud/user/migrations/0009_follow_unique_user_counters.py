@@ -0,0 +1,58 @@
+# Generated by Django 3.2.6 on 2026-10-17 01:23
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(queryset, field_name):
+    subquery = queryset.filter(**{field_name: OuterRef('pk')}).order_by().values(field_name).annotate(value=Count('*')).values('value')
+
+    return Coalesce(Subquery(subquery, output_field=IntegerField()), 0)
+
+
+def remove_duplicates(apps, schema_editor):
+    """
+    Keeps the first row of every (follower, followee).
+    """
+    Follow = apps.get_model('user', 'Follow')
+
+    duplicates = Follow.objects.values('follower_id', 'followee_id').annotate(first=Min('id'), count=Count('id')).filter(count__gt=1)
+    for duplicate in duplicates:
+        Follow.objects.filter(follower_id=duplicate['follower_id'], followee_id=duplicate['followee_id']).exclude(id=duplicate['first']).delete()
+
+
+def populate_counters(apps, schema_editor):
+    User = apps.get_model('user', 'User')
+    Follow = apps.get_model('user', 'Follow')
+
+    User.objects.update(
+        follower_count=count_of(Follow.objects.all(), 'followee'),
+        following_count=count_of(Follow.objects.all(), 'follower'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0008_user_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('follower', 'followee'), name='follow_unique'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='follower_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,57 @@
+from django.apps import apps
 from django.db import models
-from django.db.models import Count
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import BaseUserManager, AbstractBaseUser, PermissionsMixin
 from django.conf import settings
-
-
-class CustomUserManager(BaseUserManager):
+from soundcloud.counters import CounterMixin, count_of
+
+
+class UserQuerySet(models.QuerySet):
+
+    # Columns needed to authenticate a request and to nest the request user in 'SimpleUserSerializer'
+    AUTH_FIELDS = (
+        'id',
+        'email',
+        'permalink',
+        'display_name',
+        'image_profile',
+        'first_name',
+        'last_name',
+        'last_login',
+        'is_active',
+        'is_staff',
+        'is_superuser',
+        'follower_count',
+        'following_count',
+    )
+
+    def get_stats(self):
+        Track = apps.get_model('track', 'Track')
+        Like = apps.get_model('reaction', 'Like')
+        Comment = apps.get_model('comment', 'Comment')
+
+        return {
+            'track_count': count_of(Track._base_manager.all(), 'artist'),
+            'like_track_count': count_of(Like.objects.filter(content_type__app_label='track', content_type__model='track'), 'user'),
+            'comment_count': count_of(Comment.objects.all(), 'writer'),
+        }
+
+    def with_stats(self, *names):
+        """
+        Annotates the counts shown in the user serializers, each with a correlated subquery
+        so that the relations don't fan out into one big join.
+        Counters stored on the user, e.g. 'follower_count', are read from their column.
+        """
+        stats = self.get_stats()
+        names = [ name for name in names or stats.keys() if name in stats ]
+
+        return self.annotate(**{ name: stats[name] for name in names })
+
+    def for_auth(self):
+        return self.only(*self.AUTH_FIELDS)
+
+
+class CustomUserManager(BaseUserManager.from_queryset(UserQuerySet)):
     # CustomUserManager 가 위에 임포트해두고 쓰지 않는 UserManager 와 어떻게 다른지 파악하면서 보시면 좋을 것 같습니다.
     # 이메일 기반으로 인증 방식을 변경하기 위한 구현입니다.
 
@@ -49,12 +95,7 @@ class CustomUserManager(BaseUserManager):
                 return permalink
 
 
-    def get_queryset(self):
-
-        return super().get_queryset().prefetch_related('followers', 'followings', 'owned_tracks', 'comments')
-
-
-class User(AbstractBaseUser, PermissionsMixin):
+class User(CounterMixin, AbstractBaseUser, PermissionsMixin):
 
     permalink = models.SlugField(max_length=25, unique=True)
     display_name = models.CharField(max_length=25)
@@ -62,6 +103,7 @@ class User(AbstractBaseUser, PermissionsMixin):
     image_profile = models.URLField(null=True, unique=True)
     image_header = models.URLField(null=True, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     birthday = models.DateField(null=True)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
@@ -73,15 +115,53 @@ class User(AbstractBaseUser, PermissionsMixin):
     bio = models.TextField(blank=True)
     path = models.TextField(blank=True) #add for sociallogin
 
+    # Denormalized counters, kept in sync by 'UserFollowService'. (see 'reconcile_counters' command)
+    follower_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+    counter_fields = ('follower_count', 'following_count',)
+
     objects = CustomUserManager()
 
     USERNAME_FIELD = 'email'
     EMAIL_FIELD = 'email'
 
+    def get_stat(self, name):
+        """
+        Returns the count annotated by 'UserQuerySet.with_stats', or counts it with a single query.
+        """
+        if name not in self.__dict__:
+            setattr(self, name, User.objects.filter(pk=self.pk).with_stats(name).values_list(name, flat=True).get())
+
+        return getattr(self, name)
+
 
 class Follow(models.Model):
 
     follower = models.ForeignKey(get_user_model(), related_name="followings", on_delete=models.CASCADE)
     followee = models.ForeignKey(get_user_model(), related_name="followers", on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
-    
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['follower', 'followee'], name='follow_unique'),
+        ]
+
+
+class Suggestion(models.Model):
+    """
+    A user suggested to follow, stored by the 'build_suggestions' command. (see 'user.suggestions')
+    """
+
+    user = models.ForeignKey(get_user_model(), related_name="suggestions", on_delete=models.CASCADE)
+    suggestion = models.ForeignKey(get_user_model(), related_name="suggested_to", on_delete=models.CASCADE)
+    score = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'suggestion'], name='suggestion_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-score'], name='suggestion_user_score_idx'),
+        ]
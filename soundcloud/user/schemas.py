@@ -193,6 +193,7 @@ users_follow_schema = extend_schema_view(
   post=extend_schema(
       summary="Follow User",
       responses={
+          200: OpenApiResponse(description='Already Followed'),
           201: OpenApiResponse(description='Created'),
           400: OpenApiResponse(description='Bad Request'),
           401: OpenApiResponse(description='Unauthorized'),
@@ -203,9 +204,19 @@ users_follow_schema = extend_schema_view(
       summary="Unfollow User",
       responses={
           204: OpenApiResponse(description='No Content'),
-          400: OpenApiResponse(description='Bad Request'),
           401: OpenApiResponse(description='Unauthorized'),
           404: OpenApiResponse(description='Not Found'),
       }
   ),
 )
+
+users_suggestions_schema = extend_schema_view(
+  get=extend_schema(
+      summary="Users Suggested to Follow",
+      description="Users followed by the followings, or with the same likes and reposts, best first. Updated by a batch job.",
+      responses={
+          200: OpenApiResponse(response=SimpleUserSerializer(many=True), description='OK'),
+          401: OpenApiResponse(description='Unauthorized'),
+      }
+  ),
+)
@@ -5,8 +5,9 @@ from user.models import User
 class UserIndex(indexes.SearchIndex, indexes.Indexable):
     text = indexes.EdgeNgramField(document=True, use_template=True, template_name='search/user_text.txt')
     user_id = indexes.IntegerField(model_attr='id')
-    city = indexes.CharField(model_attr='city')
-    country = indexes.CharField(model_attr='country')
+    display_name = indexes.CharField(model_attr='display_name', indexed=False)
+    city = indexes.CharField(model_attr='city', faceted=True)
+    country = indexes.CharField(model_attr='country', faceted=True)
 
     def get_model(self):
         return User
@@ -14,3 +15,11 @@ class UserIndex(indexes.SearchIndex, indexes.Indexable):
     def index_queryset(self, using=None):
         """Used when the entire index for model is updated."""
         return self.get_model().objects.all()
+
+    def read_queryset(self, using=None):
+        """Used when loading the objects of a page of results, in bulk."""
+        return self.get_model().objects.with_stats()
+
+    def get_updated_field(self):
+        """Used by 'update_index --since' to only index the rows updated after the watermark."""
+        return 'updated_at'
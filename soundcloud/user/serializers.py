@@ -1,15 +1,15 @@
 from django.contrib.auth import get_user_model, authenticate
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import update_last_login
-from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema_field
 from drf_haystack.serializers import HaystackSerializerMixin
 from rest_framework import serializers, status
 from rest_framework_jwt.settings import api_settings
-from soundcloud.utils import ConflictError, MediaUploadMixin, get_presigned_url
+from soundcloud.counters import update_counter
+from soundcloud.utils import ConflictError, MediaUploadMixin, ViewerRelationListSerializer, ViewerRelationMixin, get_presigned_url
 from datetime import date
-from track.models import Track
 from user.search_indexes import UserIndex
 from user.models import Follow
 
@@ -118,7 +118,7 @@ class UserLoginSerializer(serializers.Serializer):
         update_last_login(None, self.instance)
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(ViewerRelationMixin, serializers.ModelSerializer):
 
     image_profile = serializers.SerializerMethodField()
     image_header = serializers.SerializerMethodField()
@@ -130,6 +130,8 @@ class UserSerializer(serializers.ModelSerializer):
     comment_count = serializers.SerializerMethodField()
     is_followed = serializers.SerializerMethodField(read_only=True)
 
+    stat_fields = ('follower_count', 'following_count', 'track_count', 'like_track_count', 'comment_count', )
+
     class Meta:
         model = User
         fields = (
@@ -176,6 +178,7 @@ class UserSerializer(serializers.ModelSerializer):
             'birthday',
             'is_active',
         )
+        list_serializer_class = ViewerRelationListSerializer
 
     def get_image_profile(self, user):
         return get_presigned_url(user.image_profile, 'get_object')
@@ -185,38 +188,23 @@ class UserSerializer(serializers.ModelSerializer):
 
     @extend_schema_field(OpenApiTypes.INT)
     def get_follower_count(self, user):
-        return user.followers.count()
+        return user.get_stat('follower_count')
 
     @extend_schema_field(OpenApiTypes.INT)
     def get_following_count(self, user):
-        return user.followings.count()
+        return user.get_stat('following_count')
 
     @extend_schema_field(OpenApiTypes.INT)
     def get_track_count(self, user):
-        return user.owned_tracks.count()
+        return user.get_stat('track_count')
 
     @extend_schema_field(OpenApiTypes.INT)
     def get_like_track_count(self, user):
-        content_type = ContentType.objects.get_for_model(Track)
-
-        return user.likes.filter(content_type=content_type).count()
+        return user.get_stat('like_track_count')
 
     @extend_schema_field(OpenApiTypes.INT)
     def get_comment_count(self, user):
-        return user.comments.count()
-
-    @extend_schema_field(OpenApiTypes.BOOL)
-    def get_is_followed(self, user):
-        if self.context['request'].user.is_authenticated:
-            follower = self.context['request'].user
-            followee = user
-            try:
-                Follow.objects.get(follower=follower, followee=followee)
-                return True
-            except Follow.DoesNotExist:
-                return False
-        else:
-            return False
+        return user.get_stat('comment_count')
 
     def validate_password(self, value):
 
@@ -258,13 +246,14 @@ class UserMediaUploadSerializer(MediaUploadMixin, UserSerializer):
         return data
 
 
-class SimpleUserSerializer(serializers.ModelSerializer):
+class SimpleUserSerializer(ViewerRelationMixin, serializers.ModelSerializer):
 
     image_profile = serializers.SerializerMethodField()
     follower_count = serializers.SerializerMethodField()
     track_count = serializers.SerializerMethodField()
     is_followed = serializers.SerializerMethodField(read_only=True)
 
+    stat_fields = ('follower_count', 'track_count', )
 
     class Meta:
         model = User
@@ -280,34 +269,23 @@ class SimpleUserSerializer(serializers.ModelSerializer):
             'last_name',
             'is_followed',
         )
+        list_serializer_class = ViewerRelationListSerializer
 
     def get_image_profile(self, user):
         return get_presigned_url(user.image_profile, 'get_object')
 
-    @extend_schema_field(OpenApiTypes.BOOL)
-    def get_is_followed(self, user):
-        if self.context['request'].user.is_authenticated:
-            follower = self.context['request'].user
-            followee = user
-            try:
-                Follow.objects.get(follower=follower, followee=followee)
-                return True
-            except Follow.DoesNotExist:
-                return False
-        else:
-            return False
-
     @extend_schema_field(OpenApiTypes.INT)
     def get_follower_count(self, user):
-        return user.followers.count()
+        return user.get_stat('follower_count')
 
     @extend_schema_field(OpenApiTypes.INT)
     def get_track_count(self, user):
-        return user.owned_tracks.count()
+        return user.get_stat('track_count')
 
       
 class UserFollowService(serializers.Serializer):
 
+    @transaction.atomic
     def create(self):
         follower = self.context['request'].user
         followee = self.context['user']
@@ -315,22 +293,26 @@ class UserFollowService(serializers.Serializer):
         if follower == followee:
             raise serializers.ValidationError("You cannot follow yourself.")
 
-        if Follow.objects.filter(follower=follower, followee=followee).exists():
-            raise serializers.ValidationError("Already followed.")
+        # the unique constraint settles concurrent follows
+        _, created = Follow.objects.get_or_create(follower=follower, followee=followee)
+        if not created:
+            return status.HTTP_200_OK, "Already followed."
+
+        update_counter(follower, 'following_count', 1)
+        update_counter(followee, 'follower_count', 1)
 
-        Follow.objects.create(follower=follower, followee=followee)
         return status.HTTP_201_CREATED, "Successful"
 
+    @transaction.atomic
     def delete(self):
         follower = self.context['request'].user
         followee = self.context['user']
 
-        try:
-            follow = Follow.objects.get(follower=follower, followee=followee)
-        except Follow.DoesNotExist:
-            raise serializers.ValidationError("Haven't followed yet.")
+        deleted, _ = Follow.objects.filter(follower=follower, followee=followee).delete()
+        if deleted:
+            update_counter(follower, 'following_count', -1)
+            update_counter(followee, 'follower_count', -1)
 
-        follow.delete()
         return status.HTTP_204_NO_CONTENT, "Successful"
 
 
@@ -0,0 +1,18 @@
+"""
+Keeps the follow graph up to date, see 'user.graph'.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from user import graph
+from user.models import Follow
+
+
+@receiver(post_save, sender=Follow)
+def add_following(sender, instance, created, **kwargs):
+    if created:
+        graph.add_following(instance.follower_id, instance.followee_id)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_following(sender, instance, **kwargs):
+    graph.remove_following(instance.follower_id, instance.followee_id)
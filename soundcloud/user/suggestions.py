@@ -0,0 +1,92 @@
+"""
+"Who to follow": the top suggestions of every user, computed by the 'build_suggestions' command (e.g. nightly with cron)
+and stored in Suggestion, so that serving them is a single query.
+
+A candidate scores FOLLOW_WEIGHT for each followee of the user who follows them (friends of friends),
+and REACTION_WEIGHT for each track or set that both the user and the candidate liked or reposted.
+These are the sparse products F·F and R·Rᵀ of the follow and reaction adjacency lists, computed row by row.
+"""
+from collections import defaultdict
+from heapq import nlargest
+from django.db import transaction
+from reaction.models import Like, Repost
+from user.models import Follow, Suggestion, User
+
+SUGGESTION_COUNT = 20
+BATCH_SIZE = 1000
+
+FOLLOW_WEIGHT = 1.0
+REACTION_WEIGHT = 0.5
+
+# Tracks and sets with more reactions than this say little about a shared taste, and would make R·Rᵀ quadratic
+MAX_ITEM_REACTIONS = 1000
+
+
+def load_graph():
+    """
+    Returns the adjacency lists { follower_id: {followee_id} }, { user_id: {item} } and { item: {user_id} },
+    where an item is the (content_type_id, object_id) of a liked or reposted track or set.
+    """
+    followings = defaultdict(set)
+    for follower_id, followee_id in Follow.objects.values_list('follower_id', 'followee_id').iterator():
+        followings[follower_id].add(followee_id)
+
+    reactions = defaultdict(set)
+    reactors = defaultdict(set)
+    for reaction_type in (Like, Repost):
+        for user_id, content_type_id, object_id in reaction_type.objects.values_list('user_id', 'content_type_id', 'object_id').iterator():
+            reactions[user_id].add((content_type_id, object_id))
+            reactors[(content_type_id, object_id)].add(user_id)
+
+    return followings, reactions, reactors
+
+
+def score_candidates(user_id, followings, reactions, reactors):
+    """
+    Returns { candidate_id: score } of the user, without the user and their followees.
+    """
+    scores = defaultdict(float)
+
+    for followee_id in followings.get(user_id, ()):
+        for candidate_id in followings.get(followee_id, ()):
+            scores[candidate_id] += FOLLOW_WEIGHT
+
+    for item in reactions.get(user_id, ()):
+        if len(reactors[item]) > MAX_ITEM_REACTIONS:
+            continue
+        for candidate_id in reactors[item]:
+            scores[candidate_id] += REACTION_WEIGHT
+
+    scores.pop(user_id, None)
+    for followee_id in followings.get(user_id, ()):
+        scores.pop(followee_id, None)
+
+    return scores
+
+
+def build_suggestions(count=SUGGESTION_COUNT, batch_size=BATCH_SIZE):
+    """
+    Replaces the stored suggestions of every active user with their top count candidates. Returns the number of rows written.
+    """
+    followings, reactions, reactors = load_graph()
+    user_ids = sorted(User.objects.filter(is_active=True).values_list('id', flat=True))
+    active_ids = set(user_ids)
+    total = 0
+
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        suggestions = []
+
+        for user_id in batch:
+            scores = score_candidates(user_id, followings, reactions, reactors)
+            # ties go to the older users
+            top = nlargest(count, ((score, -candidate_id) for candidate_id, score in scores.items() if candidate_id in active_ids))
+            suggestions += [ Suggestion(user_id=user_id, suggestion_id=-candidate_id, score=score) for score, candidate_id in top ]
+
+        with transaction.atomic():
+            Suggestion.objects.filter(user_id__in=batch).delete()
+            Suggestion.objects.bulk_create(suggestions, batch_size=batch_size)
+
+        total += len(suggestions)
+
+    return total
@@ -1,10 +1,9 @@
 from django.contrib.auth import get_user_model, logout
-from django.db.models import Q
+from django.db.models import F, Q
 from drf_spectacular.utils import OpenApiParameter, OpenApiResponse, extend_schema, extend_schema_view
 from drf_haystack.viewsets import HaystackGenericAPIView
 from rest_framework import status, permissions, viewsets
-from rest_framework.filters import OrderingFilter
-from rest_framework.generics import GenericAPIView, CreateAPIView, RetrieveUpdateAPIView, get_object_or_404
+from rest_framework.generics import GenericAPIView, CreateAPIView, ListAPIView, RetrieveUpdateAPIView, get_object_or_404
 from rest_framework.mixins import ListModelMixin
 from rest_framework.response import Response
 from rest_framework.decorators import action
@@ -13,7 +12,9 @@ from comment.models import Comment
 from comment.serializers import UserCommentSerializer
 from set.models import Set
 from set.serializers import SimpleSetSerializer
+from track.models import Track
 from track.serializers import SimpleTrackSerializer, UserTrackSerializer
+from soundcloud.utils import CustomOrderingFilter, SearchPagination, ViewerRelations
 from user.schemas import *
 from user.serializers import *
 from datetime import datetime
@@ -56,9 +57,10 @@ class UserLogoutView(APIView):
 class UserViewSet(viewsets.ReadOnlyModelViewSet):
 
     lookup_url_kwarg = 'user_id'
-    filter_backends = (OrderingFilter, )
+    filter_backends = (CustomOrderingFilter, )
     ordering_fields = ['created_at']
     ordering = ['-created_at']
+    ordering_aliases = {}
 
     def get_serializer_class(self):
         if self.action in ['list', 'followers', 'followings']:
@@ -76,15 +78,14 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
 
     def get_queryset(self):
         if self.action in ['retrieve', 'list']:
-            return User.objects.all()
+            return User.objects.with_stats()
 
         self.user = getattr(self, 'user', None) or get_object_or_404(User, pk=self.kwargs[self.lookup_url_kwarg])
         
         # hide private tracks in the queryset
         request_user = self.request.user if self.request.user.is_authenticated else None
         track_queryset = Track.objects \
-            .exclude(~Q(artist=request_user) & Q(is_private=True)) \
-            .prefetch_related('artist__followers', 'artist__owned_tracks')
+            .exclude(~Q(artist=request_user) & Q(is_private=True))
 
         # hide private sets in the queryset
         set_queryset = Set.objects \
@@ -95,16 +96,16 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
             .exclude(~Q(track__artist=request_user) & Q(track__is_private=True))
 
         querysets = {
-            'followers': User.objects.filter(followings__followee=self.user),
-            'followings': User.objects.filter(followers__follower=self.user),
+            'followers': User.objects.with_stats().filter(followings__followee=self.user),
+            'followings': User.objects.with_stats().filter(followers__follower=self.user),
             'tracks': track_queryset.filter(artist=self.user),
             'sets': set_queryset.filter(creator=self.user),
             'likes_tracks': track_queryset.filter(likes__user=self.user),
             'reposts_tracks': track_queryset.filter(reposts__user=self.user),
             'likes_sets': set_queryset.filter(likes__user=self.user),
             'reposts_sets': set_queryset.filter(reposts__user=self.user),
-            'history_tracks': track_queryset.filter(players=self.user),
-            'history_sets': set_queryset.filter(players=self.user),
+            'history_tracks': track_queryset.filter(trackhit__user=self.user).annotate(last_hit=F('trackhit__last_hit')),
+            'history_sets': set_queryset.filter(sethit__user=self.user).annotate(last_hit=F('sethit__last_hit')),
             'comments': comment_queryset.filter(writer=self.user),
         }
 
@@ -145,11 +146,13 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
     def reposts_sets(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
-    @action(detail=True, url_path='history/tracks', ordering_fields=['trackhit__last_hit'], ordering=['-trackhit__last_hit'])
+    @action(detail=True, url_path='history/tracks', ordering_fields=['last_hit'], ordering=['-last_hit'],
+            ordering_aliases={'trackhit__last_hit': 'last_hit'})
     def history_tracks(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
-    @action(detail=True, url_path='history/sets', ordering_fields=['sethit__last_hit'], ordering=['-sethit__last_hit'])
+    @action(detail=True, url_path='history/sets', ordering_fields=['last_hit'], ordering=['-last_hit'],
+            ordering_aliases={'sethit__last_hit': 'last_hit'})
     def history_sets(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
@@ -162,9 +165,11 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
 class UserSelfView(RetrieveUpdateAPIView):
 
     serializer_class = UserSerializer
-    queryset = User.objects.all()
     permission_classes = (permissions.IsAuthenticated, )
 
+    def get_queryset(self):
+        return User.objects.with_stats()
+
     def get_serializer_class(self):
         if self.request.method in [ 'PUT', 'PATCH' ]:
             return UserMediaUploadSerializer
@@ -202,13 +207,43 @@ class UserFollowView(GenericAPIView):
         return Response(status=status, data=data)
 
 
+@users_suggestions_schema
+class UserSuggestionView(ListAPIView):
+
+    serializer_class = SimpleUserSerializer
+    permission_classes = (permissions.IsAuthenticated, )
+    pagination_class = None
+
+    def get_queryset(self):
+        return User.objects \
+            .with_stats(*SimpleUserSerializer.stat_fields) \
+            .filter(suggested_to__user=self.request.user) \
+            .annotate(score=F('suggested_to__score')) \
+            .order_by('-score', 'id')
+
+    def list(self, request, *args, **kwargs):
+        context = self.get_serializer_context()
+        users = list(self.get_queryset())
+
+        # leave out the users followed since the suggestions were built
+        relations = ViewerRelations.of(context)
+        relations.resolve_follows([ user.id for user in users ])
+        users = [ user for user in users if not relations.is_followed(user.id) ]
+
+        serializer = self.get_serializer_class()(users, many=True, context=context)
+
+        return Response(serializer.data)
+
+
 class UserSearchAPIView(ListModelMixin, HaystackGenericAPIView):
     index_models = [User]
     serializer_class = UserSearchSerializer
+    pagination_class = SearchPagination
+    facet_fields = ('city', 'country', )
 
     def get_queryset(self, index_models=[]):
         queryset = self.object_class()._clone()
-        queryset = queryset.models(*self.index_models)
+        queryset = queryset.models(*self.index_models).load_all()
 
         ids = self.request.data.get('ids', None)
         location = self.request.data.get('location', None)
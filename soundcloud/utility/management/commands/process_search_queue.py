@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand
+from soundcloud.search_queue import BATCH_SIZE, process_queue
+
+
+class Command(BaseCommand):
+    help = "Applies the queued saves and deletes of tracks, sets and users to the search index."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Number of objects indexed at once.")
+        parser.add_argument('--interval', type=int, default=None, help="Keep processing the queue every INTERVAL seconds.")
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+
+        while True:
+            count = 0
+            while True:
+                processed = process_queue(options['batch_size'])
+                count += processed
+                if processed < options['batch_size']:
+                    break
+
+            if count or interval is None:
+                self.stdout.write(f"Indexed {count} object(s).")
+
+            if interval is None:
+                break
+            time.sleep(interval)
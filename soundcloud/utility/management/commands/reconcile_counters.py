@@ -0,0 +1,54 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from comment.models import Comment
+from reaction.models import Like, Repost
+from set.models import Set, SetTrack
+from soundcloud.counters import count_of, sum_of
+from track.models import Track, TrackHit
+from user.models import Follow, User
+
+
+def get_counters():
+    track_type = ContentType.objects.get_for_model(Track)
+    set_type = ContentType.objects.get_for_model(Set)
+
+    return {
+        Track: {
+            'play_count': sum_of(TrackHit.objects.all(), 'track', 'count'),
+            'like_count': count_of(Like.objects.filter(content_type=track_type), 'object_id'),
+            'repost_count': count_of(Repost.objects.filter(content_type=track_type), 'object_id'),
+            'comment_count': count_of(Comment.objects.all(), 'track'),
+        },
+        Set: {
+            'track_count': count_of(SetTrack.objects.all(), 'set'),
+            'like_count': count_of(Like.objects.filter(content_type=set_type), 'object_id'),
+            'repost_count': count_of(Repost.objects.filter(content_type=set_type), 'object_id'),
+        },
+        User: {
+            'follower_count': count_of(Follow.objects.all(), 'followee'),
+            'following_count': count_of(Follow.objects.all(), 'follower'),
+        },
+    }
+
+
+class Command(BaseCommand):
+    help = "Recomputes the denormalized counters of tracks, sets and users and fixes the drifted rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report the drifted rows.")
+
+    def handle(self, *args, **options):
+        for model, counters in get_counters().items():
+            for field_name, expression in counters.items():
+                with transaction.atomic():
+                    drifted = model._base_manager \
+                        .annotate(actual=expression) \
+                        .exclude(**{field_name: F('actual')})
+                    ids = list(drifted.values_list('id', flat=True))
+
+                    if ids and not options['dry_run']:
+                        model._base_manager.filter(id__in=ids).update(**{field_name: expression})
+
+                self.stdout.write(f"{model._meta.label}.{field_name}: {len(ids)} drifted row(s)")
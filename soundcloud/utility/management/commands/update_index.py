@@ -0,0 +1,26 @@
+from django.core.cache import cache
+from django.utils import timezone
+from haystack.management.commands.update_index import Command as UpdateIndexCommand
+
+WATERMARK_KEY = 'search:watermark'
+
+
+class Command(UpdateIndexCommand):
+    help = UpdateIndexCommand.help + " With --since, only indexes the rows updated after a watermark."
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--since', nargs='?', const='', default=None,
+            help="Only index the rows updated after SINCE (a datetime), or after the start of the previous --since run if no value is given.",
+        )
+
+    def handle(self, **options):
+        since = options.pop('since')
+        if since is None:
+            return super().handle(**options)
+
+        started_at = timezone.now()
+        options['start_date'] = since or cache.get(WATERMARK_KEY)
+        super().handle(**options)
+        cache.set(WATERMARK_KEY, started_at.isoformat(), timeout=None)
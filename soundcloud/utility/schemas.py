@@ -1,4 +1,5 @@
 from drf_spectacular.utils import OpenApiResponse, OpenApiParameter, extend_schema
+from utility.serializers import SuggestionsSerializer
 
 
 resolve_schema = extend_schema(
@@ -18,3 +19,26 @@ resolve_schema = extend_schema(
         404: OpenApiResponse(description='Not Found'),
     }
 )
+
+suggest_schema = extend_schema(
+    summary="Suggest tracks, sets and users matching the prefix typed so far.",
+    parameters=[
+        OpenApiParameter(
+            name="q",
+            type=str,
+            location=OpenApiParameter.QUERY,
+            description="Words typed so far, the last one possibly incomplete",
+            required=True,
+        ),
+        OpenApiParameter(
+            name="limit",
+            type=int,
+            location=OpenApiParameter.QUERY,
+            description="Number of suggestions of each type (default 5, max 20)",
+        ),
+    ],
+    responses={
+        200: OpenApiResponse(response=SuggestionsSerializer, description='OK'),
+        400: OpenApiResponse(description='Bad Request'),
+    }
+)
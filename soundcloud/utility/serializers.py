@@ -2,8 +2,11 @@ from django.contrib.auth import get_user_model
 from rest_framework import serializers, status
 from rest_framework.generics import get_object_or_404
 from rest_framework.exceptions import ValidationError
+from concurrent.futures import ThreadPoolExecutor
+from haystack.query import SearchQuerySet
 import re
 from urllib.parse import urlparse
+from soundcloud.utils import TTLCache
 from track.models import Track
 from set.models import Set
 
@@ -27,19 +30,88 @@ class ResolveService(serializers.Serializer):
 
         if pattern_user.match(url_path):    # user
             user_permalink = url_path.split('/')[1]
-            user = get_object_or_404(User, permalink=user_permalink)
+            user = get_object_or_404(User.objects.only('id'), permalink=user_permalink)
             return "https://api.soundwaffle.com/users/" + str(user.id)
         elif pattern_track.match(url_path):  # track
             user_permalink = url_path.split('/')[1]
             track_permalink = url_path.split('/')[2]
-            user = get_object_or_404(User, permalink=user_permalink)
+            user = get_object_or_404(User.objects.only('id'), permalink=user_permalink)
             track = get_object_or_404(Track, artist=user, permalink=track_permalink)
             return "https://api.soundwaffle.com/tracks/" + str(track.id)
         elif pattern_set.match(url_path):  # set
             user_permalink = url_path.split('/')[1]
             set_permalink = url_path.split('/')[3]
-            user = get_object_or_404(User, permalink=user_permalink)
+            user = get_object_or_404(User.objects.only('id'), permalink=user_permalink)
             set = get_object_or_404(Set, creator=user, permalink=set_permalink)
             return "https://api.soundwaffle.com/sets/" + str(set.id)
         else:
             raise ValidationError("잘못된 URL 경로입니다.")
+
+
+class TrackSuggestionSerializer(serializers.Serializer):
+    id = serializers.IntegerField(source='track_id')
+    title = serializers.CharField()
+    artist_display_name = serializers.CharField()
+
+
+class SetSuggestionSerializer(serializers.Serializer):
+    id = serializers.IntegerField(source='set_id')
+    title = serializers.CharField()
+    creator_display_name = serializers.CharField()
+
+
+class UserSuggestionSerializer(serializers.Serializer):
+    id = serializers.IntegerField(source='user_id')
+    display_name = serializers.CharField()
+
+
+class SuggestionsSerializer(serializers.Serializer):
+    tracks = TrackSuggestionSerializer(many=True)
+    sets = SetSuggestionSerializer(many=True)
+    users = UserSuggestionSerializer(many=True)
+
+
+class SuggestService(serializers.Serializer):
+    """
+    Typeahead over the stored fields of the search indexes, without touching the database.
+    Only public tracks and sets are suggested, so that the answers can be shared by every viewer.
+    """
+
+    DEFAULT_LIMIT = 5
+    MAX_LIMIT = 20
+
+    # hot prefixes are answered from the memory of the worker
+    cache = TTLCache(maxsize=4096, timeout=30)
+    executor = ThreadPoolExecutor(max_workers=3)
+
+    def get_limit(self):
+        try:
+            limit = int(self.context['request'].GET.get('limit', self.DEFAULT_LIMIT))
+        except ValueError:
+            raise ValidationError("limit must be an integer.")
+
+        return min(max(limit, 1), self.MAX_LIMIT)
+
+    @staticmethod
+    def search(model, query, limit):
+        queryset = SearchQuerySet().models(model).filter(text=query)
+        if model is not User:
+            queryset = queryset.filter(is_private=False)
+
+        return list(queryset[:limit])
+
+    def execute(self):
+        # the backend matches the words of the query by prefix, so that is all the key needs
+        query = ' '.join(re.findall(r'\w+', self.context['request'].GET.get('q', '').lower()))
+        limit = self.get_limit()
+
+        if not query:
+            return status.HTTP_200_OK, { 'tracks': [], 'sets': [], 'users': [] }
+
+        data = self.cache.get((query, limit))
+        if data is None:
+            futures = { name: self.executor.submit(self.search, model, query, limit) for name, model in (('tracks', Track), ('sets', Set), ('users', User)) }
+            data = SuggestionsSerializer({ name: future.result() for name, future in futures.items() }).data
+            self.cache.set((query, limit), data)
+
+        return status.HTTP_200_OK, data
@@ -0,0 +1,115 @@
+"""
+Invalidation of the cached track/set detail responses, see 'soundcloud.utils.CachedRetrieveMixin'.
+A track detail renders the track and its artist, a set detail renders the set, its creator and its tracks.
+
+Also releases the denormalized counters of the rows deleted by cascade with a user or a track,
+which the services never see.
+"""
+from collections import defaultdict
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count, Sum
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from comment.models import Comment
+from reaction.models import Like, Repost
+from set.models import Set, SetTrack
+from soundcloud.counters import update_counters
+from soundcloud.utils import invalidate_detail_cache
+from track.models import Track, TrackHit
+from user.models import Follow, User
+
+# User fields rendered in the tracks of a set
+SET_TRACK_USER_FIELDS = {'permalink', 'display_name'}
+
+
+@receiver(post_save, sender=Track)
+@receiver(post_delete, sender=Track)
+def invalidate_track(sender, instance, **kwargs):
+    invalidate_detail_cache(Track, [instance.id])
+    invalidate_detail_cache(User, [instance.artist_id])  # track_count
+    if not kwargs.get('created', True):
+        invalidate_detail_cache(Set, SetTrack.objects.filter(track=instance).values_list('set_id', flat=True))
+
+
+@receiver(post_save, sender=Set)
+@receiver(post_delete, sender=Set)
+def invalidate_set(sender, instance, **kwargs):
+    invalidate_detail_cache(Set, [instance.id])
+
+
+@receiver(m2m_changed, sender=Track.tags.through)
+@receiver(m2m_changed, sender=Set.tags.through)
+def invalidate_tags(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+
+    if reverse:
+        invalidate_detail_cache(model, pk_set or [])
+    else:
+        invalidate_detail_cache(type(instance), [instance.id])
+
+
+@receiver(post_save, sender=SetTrack)
+@receiver(post_delete, sender=SetTrack)
+def invalidate_set_track(sender, instance, **kwargs):
+    invalidate_detail_cache(Set, [instance.set_id])
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+@receiver(post_save, sender=Repost)
+@receiver(post_delete, sender=Repost)
+def invalidate_reaction(sender, instance, **kwargs):
+    model = ContentType.objects.get_for_id(instance.content_type_id).model_class()
+    invalidate_detail_cache(model, [instance.object_id])  # like_count, repost_count
+    if sender is Like and model is Track:
+        invalidate_detail_cache(User, [instance.user_id])  # like_track_count
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment(sender, instance, **kwargs):
+    invalidate_detail_cache(Track, [instance.track_id])  # comment_count
+    invalidate_detail_cache(User, [instance.writer_id])  # comment_count
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow(sender, instance, **kwargs):
+    invalidate_detail_cache(User, [instance.follower_id, instance.followee_id])  # following_count, follower_count
+
+
+@receiver(post_save, sender=User)
+def invalidate_user(sender, instance, update_fields=None, **kwargs):
+    invalidate_detail_cache(User, [instance.id])
+    if not kwargs.get('created') and (update_fields is None or SET_TRACK_USER_FIELDS & set(update_fields)):
+        invalidate_detail_cache(Set, SetTrack.objects.filter(track__artist=instance).values_list('set_id', flat=True))
+
+
+# The receivers below run before the cascade, while the rows to count are still there.
+
+@receiver(pre_delete, sender=Track)
+def release_track_counters(sender, instance, **kwargs):
+    set_tracks = SetTrack.objects.filter(track=instance).values('set_id').annotate(count=Count('*')).order_by()
+    update_counters(Set, 'track_count', { row['set_id']: -row['count'] for row in set_tracks })
+
+
+@receiver(pre_delete, sender=User)
+def release_user_counters(sender, instance, **kwargs):
+    update_counters(User, 'follower_count', { id: -1 for id in Follow.objects.filter(follower=instance).values_list('followee_id', flat=True) })
+    update_counters(User, 'following_count', { id: -1 for id in Follow.objects.filter(followee=instance).values_list('follower_id', flat=True) })
+
+    for reaction_type, field_name in ((Like, 'like_count'), (Repost, 'repost_count')):
+        deltas = defaultdict(dict)
+        reactions = reaction_type.objects.filter(user=instance).values('content_type_id', 'object_id').annotate(count=Count('*')).order_by()
+        for row in reactions:
+            deltas[row['content_type_id']][row['object_id']] = -row['count']
+        for content_type_id, object_deltas in deltas.items():
+            update_counters(ContentType.objects.get_for_id(content_type_id).model_class(), field_name, object_deltas)
+
+    comments = Comment.objects.filter(writer=instance).values('track_id').annotate(count=Count('*')).order_by()
+    update_counters(Track, 'comment_count', { row['track_id']: -row['count'] for row in comments })
+
+    # 'reconcile_counters' sums the remaining hits
+    hits = TrackHit.objects.filter(user=instance).values('track_id').annotate(count=Sum('count')).order_by()
+    update_counters(Track, 'play_count', { row['track_id']: -row['count'] for row in hits })
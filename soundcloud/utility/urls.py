@@ -1,7 +1,8 @@
 from django.urls import path
-from .views import ResolveView
+from .views import ResolveView, SuggestView
 
 
 urlpatterns = [
     path('resolve', ResolveView.as_view(), name='resolve'),  # /resolve
+    path('search/suggest', SuggestView.as_view(), name='search-suggest'),  # /search/suggest
 ]
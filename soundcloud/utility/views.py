@@ -3,7 +3,7 @@ from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from utility.schemas import *
-from utility.serializers import ResolveService
+from utility.serializers import ResolveService, SuggestService
 
 User = get_user_model()
 
@@ -22,3 +22,13 @@ class ResolveView(APIView):
         service = ResolveService(context={'request': request})
         url = service.execute()
         return Response(status=status.HTTP_302_FOUND, headers={'Location': url})
+
+
+@suggest_schema
+class SuggestView(APIView):
+
+    def get(self, request, *args, **kwargs):
+        service = SuggestService(context={'request': request})
+        status, data = service.execute()
+
+        return Response(status=status, data=data)